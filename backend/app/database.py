@@ -1,13 +1,59 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.concurrency import run_in_threadpool
+from .services.profiler import profiled
+
+# DATABASE_URL permet de pointer vers une autre base (benchmarks, tests manuels)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./products.db")
+# Routes catalogue / galerie sur SQLAlchemy async + aiosqlite (l'event loop n'attend plus la base)
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "0") == "1"
+# Connexions gardées ouvertes (chaque connexion SQLite a son propre cache de pages)
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "8"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "8"))
+
+# --- Pragmas SQLite ---
+# WAL : les lectures ne sont plus bloquées par une écriture (et inversement)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL suffit en WAL : pas de corruption possible, seules les dernières transactions
+# peuvent être perdues en cas de coupure de courant
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "32"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+# Attente max d'un verrou d'écriture avant "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+_IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        # Taille négative = en Kio
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./products.db"
 
 # connect_args={"check_same_thread": False} est nécessaire pour SQLite avec FastAPI
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if _IS_SQLITE else {},
+    poolclass=QueuePool,
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_MAX_OVERFLOW,
+    pool_pre_ping=not _IS_SQLITE,
 )
+if _IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -19,3 +65,85 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --- Accès async (DATABASE_ASYNC=1) ---
+_async_session_factory = None
+
+def async_url(url):
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db (pilote async du même moteur)."""
+    scheme, _, rest = url.partition("://")
+    if "+" in scheme:
+        return url
+    if scheme != "sqlite":
+        raise ValueError(f"No async driver configured for {scheme}")
+    return f"sqlite+aiosqlite://{rest}"
+
+def async_session_factory():
+    """Sessions AsyncSession (aiosqlite importé seulement si le mode async est activé)."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+        async_engine = create_async_engine(
+            async_url(SQLALCHEMY_DATABASE_URL),
+            pool_size=DATABASE_POOL_SIZE,
+            max_overflow=DATABASE_MAX_OVERFLOW,
+        )
+        if _IS_SQLITE:
+            event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        _async_session_factory = sessionmaker(
+            async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+class SessionRunner:
+    """
+    Exécute une fonction ORM synchrone fn(session, *args) depuis une route async :
+    - mode sync (défaut) : session classique, appel dans le threadpool de Starlette ;
+    - mode async : AsyncSession.run_sync, les entrées/sorties passent par aiosqlite.
+    Dans les deux cas, l'event loop n'attend pas la base.
+    Les requêtes restent écrites une seule fois, avec l'API Session habituelle.
+    """
+
+    def __init__(self, session, is_async):
+        self.session = session
+        self.is_async = is_async
+
+    async def run(self, fn, *args, **kwargs):
+        # Capturé par cProfile si la requête est profilée (X-Lumina-Profile)
+        if self.is_async:
+            return await self.session.run_sync(profiled("db", fn), *args, **kwargs)
+        return await run_in_threadpool(profiled("db", fn), self.session, *args, **kwargs)
+
+
+# Dependency : SessionRunner selon DATABASE_ASYNC
+async def get_session_runner():
+    if DATABASE_ASYNC:
+        async with async_session_factory()() as session:
+            yield SessionRunner(session, is_async=True)
+    else:
+        db = SessionLocal()
+        try:
+            yield SessionRunner(db, is_async=False)
+        finally:
+            db.close()
+
+def ensure_schema(bind):
+    """
+    Migration légère : create_all ne modifie pas les tables existantes.
+    Ajoute les colonnes manquantes (ALTER TABLE) et crée les index absents.
+    """
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+            print(f"🛠️ Added column {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer
+import time
+from sqlalchemy import Column, String, Integer, Float, Index
 from .database import Base
 
 class Product(Base):
@@ -11,3 +12,30 @@ class Product(Base):
     category = Column(String, index=True)
     link = Column(String)
     match = Column(String, default="100%")
+    # Embeddings IP-Adapter précalculés à l'ingestion (chemin du fichier .pt)
+    ip_adapter_embeds = Column(String, nullable=True)
+    # Attributs visuels calculés à l'ingestion (prompt intelligent du staging)
+    dominant_color = Column(String, nullable=True)
+    color_palette = Column(String, nullable=True)
+    aspect_ratio = Column(Float, nullable=True)
+    shape_class = Column(String, nullable=True)
+    # Date d'écriture de la ligne : entre dans la version du catalogue (ETag de /products)
+    updated_at = Column(Float, index=True, default=time.time)
+
+class GalleryImage(Base):
+    """Index persistant des images de static/gallery (évite listdir + stat à chaque requête)."""
+    __tablename__ = "gallery_images"
+
+    # Ordre d'insertion = ordre chronologique : sert de curseur de pagination
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    filename = Column(String, unique=True, index=True)
+    kind = Column(String, index=True)
+    created_at = Column(Float)
+    # Tailles de miniatures disponibles, ex: "256,512" (vide tant qu'elles ne sont pas générées)
+    thumbnail_sizes = Column(String, default="")
+    # Dernière modification de la ligne : entre dans l'ETag de /gallery
+    updated_at = Column(Float, index=True)
+
+    __table_args__ = (
+        Index("ix_gallery_images_kind_id", "kind", "id"),
+    )
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-import shutil
-import os
-from ..services.vision_service import vision_service
+from typing import List
+import hashlib
+from ..services.vision_service import vision_service, detection_cache
+from ..services.upload_store import upload_store
+from ..services.image_utils import decode_image_bytes
+from ..services.profiler import profiled
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Nombre max d'images acceptées par /detect/batch
+DETECT_BATCH_MAX_FILES = 64
 
 @router.post("/detect")
 async def detect_objects(file: UploadFile = File(...)):
@@ -15,16 +19,84 @@ async def detect_objects(file: UploadFile = File(...)):
     Endpoint pour détecter les objets dans une image (Shop the Look).
     """
     try:
-        # Sauvegarde temporaire pour YOLO
-        file_location = f"{UPLOAD_DIR}/{file.filename}"
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Lecture en streaming (stockage dédupliqué par hash)
+        upload = await upload_store.save(file)
+        objects = vision_service.cached_detections(upload.digest)
+        if objects is not None:
+            return {"objects": objects}
+
+        image = upload.decode()
+        if image is None:
+            return JSONResponse(content={"error": "Impossible de traiter l'image"}, status_code=400)
         
-        # Détection
-        objects = vision_service.detect_objects(file_location)
+        # Détection directement sur l'image décodée (pas de relecture disque)
+        objects = await run_in_threadpool(profiled("detect", vision_service.detect_objects), image, 0.25, upload.digest)
         
         return {"objects": objects}
 
     except Exception as e:
         print(f"Erreur détection: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
+
+def _prepare_batch(contents, conf_threshold):
+    """
+    SHA-256 des fichiers d'un batch, en un seul appel hors event loop. Comme /detect,
+    le cache est consulté par digest avant tout décodage : seules les images absentes
+    sont décodées. Retourne [(digest, détections en cache ou None, image ou None)].
+    """
+    prepared = []
+    for data in contents:
+        digest = hashlib.sha256(data).hexdigest()
+        objects = vision_service.cached_detections(digest, conf_threshold)
+        image = decode_image_bytes(data) if objects is None else None
+        prepared.append((digest, objects, image))
+    return prepared
+
+@router.post("/detect/batch")
+async def detect_objects_batch(
+    files: List[UploadFile] = File(...),
+    conf_threshold: float = Form(0.25)
+):
+    """
+    Détection sur plusieurs images en une requête (ingestion catalogue).
+    Les images absentes du cache sont décodées en mémoire et passées à YOLO par lots.
+    """
+    if len(files) > DETECT_BATCH_MAX_FILES:
+        return JSONResponse(
+            content={"error": f"Too many files (max {DETECT_BATCH_MAX_FILES})"},
+            status_code=400
+        )
+    try:
+        results = [None] * len(files)
+        contents = [await file.read() for file in files]
+        # cv2.imdecode et sha256 de 64 images bloqueraient l'event loop
+        prepared = await run_in_threadpool(profiled("detect", _prepare_batch), contents, conf_threshold)
+        images, digests, indexes = [], [], []
+        for i, (digest, objects, image) in enumerate(prepared):
+            if objects is not None:
+                results[i] = {"filename": files[i].filename, "objects": objects}
+                continue
+            if image is None:
+                results[i] = {"filename": files[i].filename, "error": "Impossible de traiter l'image"}
+                continue
+            images.append(image)
+            digests.append(digest)
+            indexes.append(i)
+
+        if images:
+            detections = await run_in_threadpool(
+                profiled("detect", vision_service.detect_batch), images, conf_threshold, digests=digests
+            )
+            for i, objects in zip(indexes, detections):
+                results[i] = {"filename": files[i].filename, "objects": objects}
+
+        return {"results": results}
+
+    except Exception as e:
+        print(f"Erreur détection batch: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.get("/detect/cache")
+async def get_detection_cache_stats():
+    """Compteurs du cache de détections (hits / misses / taille)."""
+    return detection_cache.stats()
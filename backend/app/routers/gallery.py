@@ -1,29 +1,46 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse
+from typing import Optional
 import os
+from ..database import get_session_runner, SessionRunner
+from ..services.gallery_index import gallery_index, GALLERY_KINDS
 
 router = APIRouter()
 
 GALLERY_DIR = "static/gallery"
 os.makedirs(GALLERY_DIR, exist_ok=True)
 
+GALLERY_PAGE_SIZE = 60
+GALLERY_MAX_PAGE_SIZE = 200
+
 @router.get("/gallery")
-async def get_gallery():
-    """Retourne la liste des images de la galerie"""
+async def get_gallery(
+    request: Request,
+    limit: int = Query(GALLERY_PAGE_SIZE, ge=1, le=GALLERY_MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    kind: Optional[str] = Query(None, description="generated | inpainted"),
+    db: SessionRunner = Depends(get_session_runner)
+):
+    """
+    Retourne une page d'images de la galerie (plus récentes en premier).
+    Pagination par curseur (`next_cursor`), filtre par type, ETag / If-None-Match.
+    """
     try:
-        images = []
-        # Trier par date de modification (plus récent en premier)
-        files = sorted(
-            os.listdir(GALLERY_DIR),
-            key=lambda x: os.path.getmtime(os.path.join(GALLERY_DIR, x)),
-            reverse=True
+        if kind is not None and kind not in GALLERY_KINDS:
+            return JSONResponse(content={"images": [], "error": f"Unknown kind: {kind}"}, status_code=400)
+
+        gallery_index.ensure_backfilled()
+
+        # La liste ne change que si une image a été ajoutée
+        version = await db.run(gallery_index.version)
+        etag = f'W/"gallery-{version}-{kind}-{cursor}-{limit}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        images, next_cursor = await db.run(gallery_index.page, limit, cursor=cursor, kind=kind)
+        return JSONResponse(
+            content={"images": images, "next_cursor": next_cursor},
+            headers={"ETag": etag, "Cache-Control": "no-cache"}
         )
-        
-        for filename in files:
-            if filename.endswith((".png", ".jpg", ".jpeg")):
-                images.append({
-                    "id": filename,
-                    "url": f"http://localhost:8000/static/gallery/{filename}"
-                })
-        return {"images": images}
     except Exception as e:
         return {"images": [], "error": str(e)}
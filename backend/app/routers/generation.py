@@ -1,263 +1,566 @@
 from fastapi import APIRouter, UploadFile, File, Form
 from fastapi.responses import JSONResponse
-import shutil
 import os
-import uuid
-import cv2
-import numpy as np
-from ..services.ml_service import ml_service
-from ..services.image_utils import process_canny, image_to_base64
+import time
+from ..services.ml_service import ml_service, inpainting_service, GENERATION_MAX_BATCH_SIZE, GENERATION_MAX_WAIT_MS
+from ..services.image_utils import (
+    process_canny_bytes, mask_bbox, padded_crop_box, native_size, feathered_paste
+)
+from ..services.job_queue import job_queue, QueueFullError, JobCancelledError
+from ..services.progress import step_callback
+from ..services.adapter_registry import STYLE_LORAS
+from ..services.upload_store import upload_store
+from ..services.gallery_index import gallery_index
+from ..services.thumbnails import thumbnail_generator
+from ..services.metrics import metrics
+from ..services.result_writer import result_writer
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 GALLERY_DIR = "static/gallery"
 os.makedirs(GALLERY_DIR, exist_ok=True)
 
-@router.post("/generate")
-async def generate_image(
-    file: UploadFile = File(...), 
-    prompt: str = Form(...), 
-    style: str = Form(...)
-):
+def _queue_full_response():
+    return JSONResponse(
+        content={"error": "Serveur occupé, réessayez plus tard"},
+        status_code=503,
+        headers={"Retry-After": "10"}
+    )
+
+def _job_cancelled_response():
+    return JSONResponse(content={"error": "Génération annulée"}, status_code=409)
+
+def _job_accepted_response(job):
+    return JSONResponse(
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events"
+        },
+        status_code=202
+    )
+
+# Enrichir le prompt selon le style
+STYLE_PROMPTS = {
+    "scandi": "scandinavian style, minimalist, bright, wooden furniture, white walls, cozy",
+    "indus": "industrial style, loft, brick walls, metal furniture, dark tones, raw materials",
+    "japandi": "japandi style, zen, organic shapes, neutral colors, natural light, plants",
+    "cyber": "cyberpunk style, neon lights, futuristic furniture, dark atmosphere, high tech",
+    "lux": "luxury modern style, marble, gold accents, velvet, expensive, sophisticated"
+}
+GENERATION_NEGATIVE_PROMPT = "low quality, blurry, distorted, ugly, bad anatomy, watermark, text"
+# Prompt envoyé par le frontend quand le champ est vide
+DEFAULT_GENERATION_PROMPT = "interior design"
+GENERATION_STEPS = 20
+GENERATION_GUIDANCE_SCALE = 7.5
+# Mode tuiles : plus grand côté max de l'image de contrôle (au lieu de 1024px)
+GENERATION_TILED_MAX_SIZE = int(os.getenv("GENERATION_TILED_MAX_SIZE", "4096"))
+
+# Prompts fixes de l'inpainting
+CLEANING_PROMPT = "clean background, empty room, wall, floor, interior design, high quality"
+CLEANING_NEGATIVE_PROMPT = "object, furniture, artifacts, distorted, low quality"
+STAGING_NEGATIVE_PROMPT = "low quality, blurry, bad anatomy, distorted, text, watermark, bad perspective, wrong colors, ugly"
+# Couleur détectée dans le prompt -> couleurs opposées à exclure
+STAGING_NEGATIVE_COLORS = {
+    "black": ", white, beige, grey, light color, bright",
+    "white": ", black, dark, grey",
+}
+
+# Nombre de steps de l'inpainting (valeur par défaut du service)
+INPAINT_STEPS = 20
+
+# Mode recadré : seule la zone du masque (+ contexte) passe dans l'UNet
+INPAINT_NATIVE_RESOLUTION = 512
+# Marge de contexte autour du masque (fraction de son plus grand côté)
+INPAINT_CROP_PADDING = float(os.getenv("INPAINT_CROP_PADDING", "0.25"))
+# Largeur du fondu de la couture (px, résolution d'origine)
+INPAINT_CROP_FEATHER = int(os.getenv("INPAINT_CROP_FEATHER", "12"))
+
+def _style_loras(style):
+    """LoRA de style à activer pour ce preset (vide si aucune n'est configurée)."""
+    return (style,) if style in STYLE_LORAS else ()
+
+def _style_prompt(prompt, style):
+    return f"{prompt}, {STYLE_PROMPTS.get(style, '')}, interior design, photorealistic, 8k, high quality"
+
+# Embeddings texte pré-calculés au warm-up : presets de style (prompt par défaut) et négatifs
+for _style in STYLE_PROMPTS:
+    ml_service.register_warm_prompts(
+        [_style_prompt(DEFAULT_GENERATION_PROMPT, _style), GENERATION_NEGATIVE_PROMPT],
+        style_loras=_style_loras(_style)
+    )
+inpainting_service.register_warm_prompts(
+    [CLEANING_PROMPT, CLEANING_NEGATIVE_PROMPT, STAGING_NEGATIVE_PROMPT]
+    + [STAGING_NEGATIVE_PROMPT + colors for colors in STAGING_NEGATIVE_COLORS.values()]
+)
+
+def _generation_batch_key(upload, style):
     """
-    Endpoint pour générer une image d'intérieur.
-    1. Sauvegarde l'image uploadée.
-    2. Prépare l'image pour ControlNet (Canny).
-    3. Lance la génération Stable Diffusion.
-    4. Sauvegarde le résultat.
+    Clé de compatibilité pour le micro-batching : steps, guidance, LoRA de style et
+    résolution finale de l'image de contrôle (après redimensionnement max 1024px, multiple de 8).
     """
     try:
-        # 1. Sauvegarde temporaire
-        file_location = f"{UPLOAD_DIR}/{file.filename}"
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 2. Préparation (Canny)
-        canny_image = process_canny(file_location)
+        w, h = upload.size()
+    except Exception:
+        return None
+    if h > 1024 or w > 1024:
+        scale = 1024 / max(h, w)
+        w, h = int(w * scale), int(h * scale)
+    return (GENERATION_STEPS, GENERATION_GUIDANCE_SCALE, _style_loras(style), w // 8 * 8, h // 8 * 8)
+
+def _running_jobs(indices):
+    """Jobs du batch en cours correspondant aux requêtes `indices` (vide hors worker)."""
+    running = job_queue.running()
+    return [running[i] for i in indices if i < len(running)]
+
+def run_generation_batch(requests):
+    """
+    Génération d'images d'intérieur (exécutée par le worker d'inférence).
+    `requests` est une liste de tuples (upload, prompt, style), tous compatibles.
+    1. Prépare chaque image pour ControlNet (Canny).
+    2. Lance une seule génération Stable Diffusion pour tout le batch.
+    3. Sauvegarde chaque résultat.
+    Retourne un résultat (ou une Exception) par requête.
+    """
+    from PIL import Image
+
+    results = [None] * len(requests)
+    prepared = []
+    for i, (upload, prompt, style) in enumerate(requests):
+        # 1. Préparation (Canny) directement depuis les octets en mémoire
+        canny_image = process_canny_bytes(upload.data, digest=upload.digest)
         if canny_image is None:
-            return JSONResponse(content={"error": "Impossible de traiter l'image"}, status_code=400)
-        
+            results[i] = ValueError("Impossible de traiter l'image")
+            continue
         # Convertir numpy array (OpenCV) vers PIL Image pour Diffusers
-        from PIL import Image
         canny_pil = Image.fromarray(canny_image)
+        full_prompt = _style_prompt(prompt, style)
+        prepared.append((i, canny_pil, full_prompt))
 
-        # 3. Génération
-        # Enrichir le prompt selon le style
-        style_prompts = {
-            "scandi": "scandinavian style, minimalist, bright, wooden furniture, white walls, cozy",
-            "indus": "industrial style, loft, brick walls, metal furniture, dark tones, raw materials",
-            "japandi": "japandi style, zen, organic shapes, neutral colors, natural light, plants",
-            "cyber": "cyberpunk style, neon lights, futuristic furniture, dark atmosphere, high tech",
-            "lux": "luxury modern style, marble, gold accents, velvet, expensive, sophisticated"
-        }
-        full_prompt = f"{prompt}, {style_prompts.get(style, '')}, interior design, photorealistic, 8k, high quality"
-        negative_prompt = "low quality, blurry, distorted, ugly, bad anatomy, watermark, text"
+    if not prepared:
+        return results
 
-        generated_pil = ml_service.generate(
-            prompt=full_prompt,
-            image=canny_pil,
-            negative_prompt=negative_prompt
+    # 2. Génération
+    try:
+        generated = ml_service.generate_batch(
+            prompts=[full_prompt for _, _, full_prompt in prepared],
+            images=[canny_pil for _, canny_pil, _ in prepared],
+            negative_prompts=[GENERATION_NEGATIVE_PROMPT] * len(prepared),
+            steps=GENERATION_STEPS,
+            guidance_scale=GENERATION_GUIDANCE_SCALE,
+            # Même clé de batch => même style LoRA pour toutes les requêtes
+            style_loras=_style_loras(requests[prepared[0][0]][2]),
+            # Un latent par requête préparée : aperçus publiés sur les jobs correspondants
+            callback=step_callback(_running_jobs([i for i, _, _ in prepared]), GENERATION_STEPS)
         )
+    except Exception as e:
+        for i, _, _ in prepared:
+            results[i] = e
+        return results
+
+    for (i, _, _), generated_pil in zip(prepared, generated):
+        # 3. Sauvegarde du résultat (Galerie)
+        results[i] = _save_generated(generated_pil)
+    return results
+
+def _save_result(generated_pil, prefix, message):
+    """
+    Confie l'encodage et l'écriture au result_writer et retourne son Future : le worker
+    d'inférence est libéré, le job se termine dès que le fichier est en place.
+    """
+    def publish(output_filename):
+        gallery_index.add(output_filename)
+        thumbnail_generator.schedule(output_filename)
 
-        # 4. Sauvegarde du résultat (Galerie)
-        output_filename = f"generated_{uuid.uuid4()}.png"
-        output_path = os.path.join(GALLERY_DIR, output_filename)
-        generated_pil.save(output_path)
-        
         # URL pour le frontend
         image_url = f"http://localhost:8000/static/gallery/{output_filename}"
 
         return {
-            "message": "Image generated successfully", 
+            "message": message,
             "generated_image": image_url,
             "id": output_filename
         }
 
+    return result_writer.submit(generated_pil, prefix, GALLERY_DIR, then=publish)
+
+def _save_generated(generated_pil):
+    return _save_result(generated_pil, "generated", "Image generated successfully")
+
+def run_generation(upload, prompt, style):
+    """Génération d'une seule image (cas sans batching)."""
+    result = run_generation_batch([(upload, prompt, style)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def run_tiled_generation(upload, prompt, style):
+    """
+    Génération haute résolution (worker d'inférence) : Canny à pleine résolution
+    (borné à GENERATION_TILED_MAX_SIZE), puis génération par tuiles chevauchantes.
+    """
+    from PIL import Image
+
+    canny_image = process_canny_bytes(upload.data, max_size=GENERATION_TILED_MAX_SIZE, digest=upload.digest)
+    if canny_image is None:
+        raise ValueError("Impossible de traiter l'image")
+    generated_pil = ml_service.generate_tiled(
+        _style_prompt(prompt, style),
+        Image.fromarray(canny_image),
+        negative_prompt=GENERATION_NEGATIVE_PROMPT,
+        steps=GENERATION_STEPS,
+        guidance_scale=GENERATION_GUIDANCE_SCALE,
+        style_loras=_style_loras(style),
+        # Progression et aperçu de la tuile en cours
+        callback=step_callback(job_queue.running(), GENERATION_STEPS)
+    )
+    return _save_generated(generated_pil)
+
+job_queue.register_batch_handler(
+    "generate", run_generation_batch,
+    max_batch_size=GENERATION_MAX_BATCH_SIZE,
+    max_wait=GENERATION_MAX_WAIT_MS / 1000
+)
+
+def _submit_generation(upload, prompt, style, tiled=False):
+    if tiled:
+        # Une tuile à la fois : jamais regroupé avec d'autres requêtes
+        return job_queue.submit("generate_tiled", run_tiled_generation, upload, prompt, style)
+    return job_queue.submit(
+        "generate", run_generation, upload, prompt, style,
+        batch_key=_generation_batch_key(upload, style)
+    )
+
+@router.post("/generate")
+async def generate_image(
+    file: UploadFile = File(...), 
+    prompt: str = Form(...), 
+    style: str = Form(...),
+    tiled: bool = Form(False) # Haute résolution par tuiles (pas de réduction à 1024px)
+):
+    """
+    Endpoint pour générer une image d'intérieur.
+    Le travail est confié au worker d'inférence ; la route attend le résultat
+    sans bloquer l'event loop.
+    """
+    try:
+        upload = await upload_store.save(file)
+        job = _submit_generation(upload, prompt, style, tiled)
+        return await job_queue.wait(job)
+
+    except QueueFullError:
+        return _queue_full_response()
+    except JobCancelledError:
+        return _job_cancelled_response()
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
         print(f"Erreur génération: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
-@router.post("/inpaint")
-async def inpaint_image(
-    image: UploadFile = File(...),
-    mask: UploadFile = File(...),
-    product_image: UploadFile = File(None), 
-    product_image_url: str = Form(None), # Nouvelle option : URL directe
-    prompt: str = Form(...)
+@router.post("/jobs/generate")
+async def submit_generate_job(
+    file: UploadFile = File(...), 
+    prompt: str = Form(...), 
+    style: str = Form(...),
+    tiled: bool = Form(False) # Haute résolution par tuiles (pas de réduction à 1024px)
 ):
+    """Soumet une génération et retourne immédiatement l'id du job."""
+    try:
+        upload = await upload_store.save(file)
+        job = _submit_generation(upload, prompt, style, tiled)
+        return _job_accepted_response(job)
+    except QueueFullError:
+        return _queue_full_response()
+
+# Mots-clés ajoutés au prompt de staging selon la forme du produit
+SHAPE_KEYWORDS = {
+    "wide": "wide, sectional sofa, L-shaped, corner sofa"
+}
+
+def _load_product(product_id):
+    """Ligne catalogue d'un produit (None si inconnu)."""
+    from ..database import SessionLocal
+    from ..models import Product
+
+    db = SessionLocal()
+    try:
+        return db.query(Product).filter(Product.id == product_id).first()
+    finally:
+        db.close()
+
+def _load_product_embeds(product):
+    """Embeddings IP-Adapter précalculés d'un produit du catalogue (None si indisponibles)."""
+    from ..services.product_embeddings import product_embeddings
+
+    if not product.ip_adapter_embeds or not os.path.exists(product.ip_adapter_embeds):
+        return None
+    try:
+        return product_embeddings.load(product.ip_adapter_embeds)
+    except Exception as e:
+        print(f"⚠️ Could not load embeddings of product {product.id}: {e}")
+        return None
+
+def run_inpainting(image_bytes, mask_bytes, product_bytes, product_image_url, prompt, product_id=None, crop=False):
     """
-    Endpoint pour l'Inpainting (Remplacement d'objet).
-    Supporte maintenant le Virtual Staging via IP-Adapter si product_image ou product_image_url est fourni.
+    Inpainting (Remplacement d'objet), exécuté par le worker d'inférence.
+    Supporte le Virtual Staging via IP-Adapter si product_bytes, product_id ou product_image_url est fourni.
+    Avec crop=True, seule la boîte du masque (+ marge) est inpaintée à la résolution native
+    du modèle puis recollée dans la photo d'origine, qui garde sa pleine résolution.
     """
-    try:
-        from ..services.ml_service import inpainting_service
-        from PIL import Image
-        import io
-        import urllib.request
+    from ..services.image_fetcher import image_fetcher
+    from PIL import Image
+    import io
 
-        # 1. Lire Image et Masque
-        print("📥 Reading inputs...")
-        image_bytes = await image.read()
-        mask_bytes = await mask.read()
-        print(f"✅ Image read: {len(image_bytes)} bytes")
-        print(f"✅ Mask read: {len(mask_bytes)} bytes")
-        
-        try:
+    # 1. Décoder Image et Masque
+    try:
+        with metrics.stage("decode"):
             init_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            print("✅ Init image opened")
-        except Exception as e:
-            print(f"❌ Error opening init image: {e}")
-            raise e
+        print("✅ Init image opened")
+    except Exception as e:
+        print(f"❌ Error opening init image: {e}")
+        raise e
 
-        try:
+    try:
+        with metrics.stage("decode"):
             mask_image = Image.open(io.BytesIO(mask_bytes)).convert("RGB")
-            print("✅ Mask image opened")
-        except Exception as e:
-            print(f"❌ Error opening mask image: {e}")
-            raise e
+        print("✅ Mask image opened")
+    except Exception as e:
+        print(f"❌ Error opening mask image: {e}")
+        raise e
 
+    crop_box = None
+    if crop:
+        # Masque aligné sur la photo d'origine (le canvas du frontend peut avoir une autre taille)
+        full_mask = mask_image.convert("L").resize(init_image.size, Image.NEAREST)
+        bbox = mask_bbox(full_mask)
+        if bbox is None:
+            print("⚠️ Empty mask, falling back to full-frame inpainting")
+        else:
+            original_image = init_image
+            crop_box = padded_crop_box(bbox, original_image.size, padding=INPAINT_CROP_PADDING)
+            work_size = native_size(
+                (crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]), INPAINT_NATIVE_RESOLUTION
+            )
+            init_image = original_image.crop(crop_box).resize(work_size, Image.LANCZOS)
+            mask_image = full_mask.crop(crop_box).resize(work_size, Image.NEAREST).convert("RGB")
+            print(f"✂️ Crop mode: {crop_box} of {original_image.size} -> {work_size}")
+
+    if crop_box is None:
         # Redimensionner pour éviter OOM (max 1024px)
         init_image.thumbnail((1024, 1024), Image.LANCZOS)
         mask_image.thumbnail((1024, 1024), Image.LANCZOS)
+    # Taille de sortie explicite en mode recadré (sinon celle par défaut du pipeline)
+    output_size = {"width": init_image.width, "height": init_image.height} if crop_box else {}
 
-        # 1b. Lire l'image produit (Fichier OU URL)
-        ip_adapter_image = None
-        
-        # Priorité 1: Fichier uploadé (si valide)
-        if product_image:
-            print("📥 Reading product image from file...")
-            product_bytes = await product_image.read()
-            if len(product_bytes) > 100: # Simple check pour éviter les fichiers corrompus/vides
-                try:
-                    ip_adapter_image = Image.open(io.BytesIO(product_bytes)).convert("RGB")
-                    print("✅ Product image opened from file")
-                except Exception as e:
-                    print(f"❌ Error opening product image file: {e}")
-
-        # Priorité 2: URL (si pas d'image valide encore)
-        if ip_adapter_image is None and product_image_url:
-            print(f"📥 Processing product image URL: {product_image_url}")
-            
-            # FIX: Détection URL locale (localhost) pour éviter le deadlock
-            if "localhost" in product_image_url or "127.0.0.1" in product_image_url:
-                try:
-                    # Extraction du chemin relatif
-                    # Ex: http://localhost:8000/static/products/xyz.png -> static/products/xyz.png
-                    if "/static/" in product_image_url:
-                        relative_path = product_image_url.split("/static/")[1]
-                        local_path = os.path.join("static", relative_path)
-                        
-                        if os.path.exists(local_path):
-                            print(f"📂 Reading local file directly: {local_path}")
-                            ip_adapter_image = Image.open(local_path).convert("RGB")
-                            print("✅ Product image opened from local disk")
-                        else:
-                            print(f"❌ Local file not found: {local_path}")
-                except Exception as e:
-                    print(f"❌ Error reading local file: {e}")
-
-            # Si toujours pas chargé (URL externe ou échec local), on télécharge
-            if ip_adapter_image is None:
-                try:
-                    print(f"🌐 Downloading from external URL...")
-                    # Téléchargement via urllib avec User-Agent pour éviter 403/404 sur certains sites
-                    req = urllib.request.Request(
-                        product_image_url, 
-                        headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-                    )
-                    with urllib.request.urlopen(req) as response:
-                        url_bytes = response.read()
-                        ip_adapter_image = Image.open(io.BytesIO(url_bytes)).convert("RGB")
-                        print("✅ Product image downloaded and opened")
-                except Exception as e:
-                    print(f"❌ Error downloading product image: {e}")
-
-        # Redimensionnement image produit
-        if ip_adapter_image:
-            ip_adapter_image.thumbnail((512, 512), Image.LANCZOS)
-
-        # 2. Génération Inpainting
+    # 1b. Lire l'image produit (Embeddings précalculés, Fichier OU URL)
+    ip_adapter_image = None
+    ip_adapter_image_embeds = None
+
+    # Priorité 0: Produit du catalogue avec embeddings précalculés (ni image, ni encodeur)
+    product = _load_product(product_id) if product_id and not product_bytes else None
+    if product is not None:
+        ip_adapter_image_embeds = _load_product_embeds(product)
+        if ip_adapter_image_embeds is not None:
+            print(f"🧬 Using precomputed embeddings for product {product_id}")
+    
+    # Priorité 1: Fichier uploadé (si valide)
+    if product_bytes:
+        if len(product_bytes) > 100: # Simple check pour éviter les fichiers corrompus/vides
+            try:
+                ip_adapter_image = Image.open(io.BytesIO(product_bytes)).convert("RGB")
+                print("✅ Product image opened from file")
+            except Exception as e:
+                print(f"❌ Error opening product image file: {e}")
+
+    # Priorité 2: URL (si pas d'image valide encore)
+    if ip_adapter_image is None and ip_adapter_image_embeds is None and product_image_url:
+        print(f"📥 Processing product image URL: {product_image_url}")
         
-        # MODE GOMME (REMOVE) : Pas d'image produit
+        # FIX: Détection URL locale (localhost) pour éviter le deadlock
+        if "localhost" in product_image_url or "127.0.0.1" in product_image_url:
+            try:
+                # Extraction du chemin relatif
+                # Ex: http://localhost:8000/static/products/xyz.png -> static/products/xyz.png
+                if "/static/" in product_image_url:
+                    relative_path = product_image_url.split("/static/")[1]
+                    local_path = os.path.join("static", relative_path)
+                    
+                    if os.path.exists(local_path):
+                        print(f"📂 Reading local file directly: {local_path}")
+                        ip_adapter_image = Image.open(local_path).convert("RGB")
+                        print("✅ Product image opened from local disk")
+                    else:
+                        print(f"❌ Local file not found: {local_path}")
+            except Exception as e:
+                print(f"❌ Error reading local file: {e}")
+
+        # Si toujours pas chargé (URL externe ou échec local), on télécharge
         if ip_adapter_image is None:
-            print("🧹 Mode: Remove Object (Cleaning)")
-            generated_pil = inpainting_service.inpaint(
-                prompt="clean background, empty room, wall, floor, interior design, high quality",
-                image=init_image,
-                mask_image=mask_image,
-                ip_adapter_image=None,
-                negative_prompt="object, furniture, artifacts, distorted, low quality",
-                guidance_scale=7.5 # Standard pour le nettoyage
-            )
-            
-        # MODE AJOUT (ADD) : Avec image produit
-        else:
-            print("furniture Mode: Add Product (Staging)")
-            # Si staging produit, on force un prompt descriptif basé sur le nom du produit (si dispo) ou le prompt utilisateur
-            final_prompt = prompt
             try:
+                print(f"🌐 Downloading from external URL...")
+                # Connexions partagées + cache disque (ETag / Last-Modified)
+                url_bytes = image_fetcher.fetch_sync(product_image_url)
+                ip_adapter_image = Image.open(io.BytesIO(url_bytes)).convert("RGB")
+                print("✅ Product image downloaded and opened")
+            except Exception as e:
+                print(f"❌ Error downloading product image: {e}")
+
+    # Redimensionnement image produit
+    if ip_adapter_image:
+        ip_adapter_image.thumbnail((512, 512), Image.LANCZOS)
+
+    # 2. Génération Inpainting
+    
+    # MODE GOMME (REMOVE) : Pas d'image produit
+    if ip_adapter_image is None and ip_adapter_image_embeds is None:
+        print("🧹 Mode: Remove Object (Cleaning)")
+        generated_pil = inpainting_service.inpaint(
+            prompt=CLEANING_PROMPT,
+            image=init_image,
+            mask_image=mask_image,
+            ip_adapter_image=None,
+            negative_prompt=CLEANING_NEGATIVE_PROMPT,
+            guidance_scale=7.5, # Standard pour le nettoyage
+            steps=INPAINT_STEPS,
+            callback=step_callback(job_queue.running(), INPAINT_STEPS),
+            **output_size
+        )
+        
+    # MODE AJOUT (ADD) : Avec image produit
+    else:
+        print("furniture Mode: Add Product (Staging)")
+        # Si staging produit, on force un prompt descriptif basé sur le nom du produit (si dispo) ou le prompt utilisateur
+        final_prompt = prompt
+        prompt_started = time.perf_counter()
+        try:
+            if product is not None and product.shape_class:
+                # Attributs calculés à l'ingestion du produit (colonnes DB)
+                detected_color = product.dominant_color
+                product_shape = product.shape_class
+            elif ip_adapter_image is not None:
                 # Détection de couleur
-                from ..services.image_utils import get_dominant_color
+                from ..services.image_utils import get_dominant_color, shape_class
                 detected_color = get_dominant_color(ip_adapter_image)
                 
                 # Détection de forme (Ratio)
                 w, h = ip_adapter_image.size
-                ratio = w / h
-                shape_keywords = ""
-                # Seuil abaissé à 1.2 pour mieux détecter les canapés larges
-                if ratio > 1.2:
-                    shape_keywords = "wide, sectional sofa, L-shaped, corner sofa"
-                
-                # Construction du prompt intelligent
-                color_str = f"{detected_color} " if detected_color else ""
-                
-                # On combine tout : Couleur + Forme + Nom du produit (prompt) + Qualité
-                final_prompt = f"photo of {color_str}{prompt}, {shape_keywords}, high quality, realistic, 8k, interior design, {color_str} texture, product view"
-                
-                print(f"🧠 Smart Prompt: {final_prompt}")
-            except Exception as e:
-                print(f"⚠️ Error constructing smart prompt: {e}")
-                # Fallback safe
-                final_prompt = f"high quality photo of {prompt}, product view, photorealistic"
+                product_shape = shape_class(w / h)
+            else:
+                raise ValueError(f"no visual attributes for product {product_id}")
 
-            # Construction du Negative Prompt Dynamique
-            base_negative = "low quality, blurry, bad anatomy, distorted, text, watermark, bad perspective, wrong colors, ugly"
-            dynamic_negative = base_negative
+            shape_keywords = SHAPE_KEYWORDS.get(product_shape, "")
             
-            if "black" in final_prompt.lower():
-                dynamic_negative += ", white, beige, grey, light color, bright"
-            elif "white" in final_prompt.lower():
-                dynamic_negative += ", black, dark, grey"
-
-            generated_pil = inpainting_service.inpaint(
-                prompt=final_prompt,
-                image=init_image,
-                mask_image=mask_image,
-                ip_adapter_image=ip_adapter_image,
-                negative_prompt=dynamic_negative,
-                guidance_scale=12.0 # Augmenté pour forcer le respect du prompt (couleur)
-            )
-
-        # Nettoyage mémoire GPU
-        import torch
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+            # Construction du prompt intelligent
+            color_str = f"{detected_color} " if detected_color else ""
+            
+            # On combine tout : Couleur + Forme + Nom du produit (prompt) + Qualité
+            final_prompt = f"photo of {color_str}{prompt}, {shape_keywords}, high quality, realistic, 8k, interior design, {color_str} texture, product view"
+            
+            print(f"🧠 Smart Prompt: {final_prompt}")
+        except Exception as e:
+            print(f"⚠️ Error constructing smart prompt: {e}")
+            # Fallback safe
+            final_prompt = f"high quality photo of {prompt}, product view, photorealistic"
+        metrics.observe("prompt_build", time.perf_counter() - prompt_started)
 
-        # 3. Sauvegarde
-        output_filename = f"inpainted_{uuid.uuid4()}.png"
-        output_path = os.path.join(GALLERY_DIR, output_filename)
-        generated_pil.save(output_path)
+        # Construction du Negative Prompt Dynamique
+        dynamic_negative = STAGING_NEGATIVE_PROMPT
         
-        image_url = f"http://localhost:8000/static/gallery/{output_filename}"
+        for color, opposites in STAGING_NEGATIVE_COLORS.items():
+            if color in final_prompt.lower():
+                dynamic_negative += opposites
+                break
 
-        return {
-            "message": "Inpainting successful", 
-            "generated_image": image_url,
-            "id": output_filename
-        }
+        generated_pil = inpainting_service.inpaint(
+            prompt=final_prompt,
+            image=init_image,
+            mask_image=mask_image,
+            ip_adapter_image=ip_adapter_image,
+            ip_adapter_image_embeds=ip_adapter_image_embeds,
+            negative_prompt=dynamic_negative,
+            guidance_scale=12.0, # Augmenté pour forcer le respect du prompt (couleur)
+            steps=INPAINT_STEPS,
+            callback=step_callback(job_queue.running(), INPAINT_STEPS),
+            **output_size
+        )
+
+    # Nettoyage mémoire GPU
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+    # Mode recadré : retour à la taille de la zone, fondu dans la photo pleine résolution
+    if crop_box is not None:
+        patch = generated_pil.resize((crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]), Image.LANCZOS)
+        generated_pil = feathered_paste(original_image, patch, full_mask, crop_box, feather=INPAINT_CROP_FEATHER)
 
+    # 3. Sauvegarde (en arrière-plan)
+    return _save_result(generated_pil, "inpainted", "Inpainting successful")
+
+async def _read_inpaint_inputs(image, mask, product_image):
+    # 1. Lire Image et Masque
+    print("📥 Reading inputs...")
+    with metrics.stage("upload_read"):
+        image_bytes = await image.read()
+        mask_bytes = await mask.read()
+    print(f"✅ Image read: {len(image_bytes)} bytes")
+    print(f"✅ Mask read: {len(mask_bytes)} bytes")
+
+    product_bytes = None
+    if product_image:
+        print("📥 Reading product image from file...")
+        with metrics.stage("upload_read"):
+            product_bytes = await product_image.read()
+    return image_bytes, mask_bytes, product_bytes
+
+@router.post("/inpaint")
+async def inpaint_image(
+    image: UploadFile = File(...),
+    mask: UploadFile = File(...),
+    product_image: UploadFile = File(None), 
+    product_image_url: str = Form(None), # Nouvelle option : URL directe
+    product_id: str = Form(None), # Produit du catalogue (embeddings précalculés)
+    prompt: str = Form(...),
+    crop: bool = Form(False) # Inpainter uniquement la zone du masque, pleine résolution conservée
+):
+    """
+    Endpoint pour l'Inpainting (Remplacement d'objet).
+    Supporte maintenant le Virtual Staging via IP-Adapter si product_image ou product_image_url est fourni.
+    """
+    try:
+        image_bytes, mask_bytes, product_bytes = await _read_inpaint_inputs(image, mask, product_image)
+        job = job_queue.submit(
+            "inpaint", run_inpainting,
+            image_bytes, mask_bytes, product_bytes, product_image_url, prompt, product_id, crop
+        )
+        return await job_queue.wait(job)
+
+    except QueueFullError:
+        return _queue_full_response()
+    except JobCancelledError:
+        return _job_cancelled_response()
     except Exception as e:
         print(f"Erreur inpainting: {e}")
         return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@router.post("/jobs/inpaint")
+async def submit_inpaint_job(
+    image: UploadFile = File(...),
+    mask: UploadFile = File(...),
+    product_image: UploadFile = File(None), 
+    product_image_url: str = Form(None),
+    product_id: str = Form(None),
+    prompt: str = Form(...),
+    crop: bool = Form(False)
+):
+    """Soumet un inpainting et retourne immédiatement l'id du job."""
+    try:
+        image_bytes, mask_bytes, product_bytes = await _read_inpaint_inputs(image, mask, product_image)
+        job = job_queue.submit(
+            "inpaint", run_inpainting,
+            image_bytes, mask_bytes, product_bytes, product_image_url, prompt, product_id, crop
+        )
+        return _job_accepted_response(job)
+    except QueueFullError:
+        return _queue_full_response()
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..services.warmup import warmup_state
+
+router = APIRouter()
+
+@router.get("/health/live")
+async def liveness():
+    """Le processus répond (ne dépend pas des modèles)."""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    """
+    Prêt à recevoir du trafic : modèles chargés et warm-up terminé.
+    503 tant que le warm-up est en cours (ou a échoué).
+    """
+    state = warmup_state.to_dict()
+    return JSONResponse(content=state, status_code=200 if warmup_state.ready else 503)
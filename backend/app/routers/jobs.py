@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
+from ..services.job_queue import job_queue
+
+router = APIRouter()
+
+# Intervalle de rafraîchissement du flux SSE (secondes)
+EVENTS_POLL_INTERVAL = 0.25
+
+@router.get("/jobs")
+async def get_jobs_stats():
+    """Etat de la file d'inférence (profondeur, job en cours, compteurs)."""
+    return job_queue.stats()
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Statut (et résultat si terminé) d'un job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    data = job.to_dict()
+    data["position"] = job_queue.position(job)
+    return data
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Annule un job en attente ou en cours (interrompu au prochain step, le worker est libéré)."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_queue.cancel(job):
+        return JSONResponse(content={"error": "Job déjà terminé", "status": job.status}, status_code=409)
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """
+    Flux Server-Sent Events : un évènement à chaque changement de statut,
+    des évènements `progress` (step, total_steps, aperçu basse résolution)
+    pendant l'inférence, puis l'évènement final (done / error / cancelled).
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last_status = None
+        last_progress = None
+        last_preview = None
+        while True:
+            if job.status != last_status:
+                last_status = job.status
+                data = job.to_dict()
+                data["position"] = job_queue.position(job)
+                yield f"event: {job.status}\ndata: {json.dumps(data)}\n\n"
+            if not job.done and job.progress is not None and job.progress != last_progress:
+                last_progress = job.progress
+                data = dict(job.progress)
+                if job.preview is not last_preview:
+                    last_preview = job.preview
+                    data["preview"] = job.preview
+                yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+            if job.done:
+                break
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
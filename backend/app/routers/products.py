@@ -1,17 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
+import json
 import os
 import shutil
 import uuid
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import literal_column
 from .auth import verify_admin
-from ..database import get_db
+from ..database import get_session_runner, SessionRunner
 from ..models import Product as ProductModel
+from ..services.job_queue import job_queue, QueueFullError
+from ..services.product_embeddings import product_embeddings
+from ..services.image_utils import compute_product_attributes
+from ..services.catalog_cache import catalog_cache, catalog_version
 
 router = APIRouter()
 
 PRODUCTS_DIR = "static/products"
+PRODUCTS_MAX_PAGE_SIZE = 500
 
 # Pydantic Model for Response
 class ProductResponse(BaseModel):
@@ -26,9 +33,93 @@ class ProductResponse(BaseModel):
     class Config:
         orm_mode = True
 
+PRODUCT_FIELDS = list(ProductResponse.__fields__)
+# rowid SQLite : ordre d'insertion (ordre historique de la liste) et clé de pagination,
+# présent dans l'index sur `category`
+PRODUCT_ROWID = literal_column("products.rowid")
+
+def _query_products(db, limit, cursor, category, fields):
+    """Page du catalogue sérialisée en JSON : (body, next_cursor)."""
+    columns = [getattr(ProductModel, field) for field in fields]
+    query = db.query(PRODUCT_ROWID.label("cursor"), *columns)
+    if category:
+        query = query.filter(ProductModel.category == category)
+    if cursor is not None:
+        query = query.filter(PRODUCT_ROWID > cursor)
+    query = query.order_by(PRODUCT_ROWID)
+    if limit:
+        query = query.limit(limit + 1)
+    rows = query.all()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].cursor
+    # Sérialisation directe des colonnes (pas d'objets ORM ni de validation Pydantic)
+    body = json.dumps([{field: getattr(row, field) for field in fields} for row in rows])
+    return body.encode("utf-8"), next_cursor
+
+def _product_attributes(content):
+    """Attributs visuels de l'image produit (décodage PIL + analyse : hors event loop)."""
+    from PIL import Image
+    import io
+    return compute_product_attributes([Image.open(io.BytesIO(content))])[0]
+
+def _insert_product(db, product):
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+
+def _delete_product(db, product_id):
+    """(trouvé, chemin des embeddings IP-Adapter à supprimer)."""
+    product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
+    if not product:
+        return False, None
+    embeds_path = product.ip_adapter_embeds
+    db.delete(product)
+    db.commit()
+    return True, embeds_path
+
 @router.get("/products", response_model=List[ProductResponse])
-async def get_products(db: Session = Depends(get_db)):
-    return db.query(ProductModel).all()
+async def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=PRODUCTS_MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    category: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Ex: id,name,image"),
+    db: SessionRunner = Depends(get_session_runner)
+):
+    """
+    Catalogue produits.
+    Sans `limit`, retourne tout le catalogue ; avec `limit`, pagination par curseur
+    (en-tête `X-Next-Cursor`). `category` filtre via l'index, `fields` restreint les colonnes.
+    Réponses servies depuis le cache tant que la version du catalogue lue en base
+    ne change pas (ETag / 304, cohérents entre workers).
+    """
+    selected = PRODUCT_FIELDS
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # L'id est toujours retourné
+        selected = ["id"] + [field for field in requested if field != "id"]
+
+    key = (limit, cursor, category, tuple(selected))
+    # Lue avant la page : la réponse mise en cache est au moins aussi récente que sa version
+    version = await db.run(catalog_version)
+    entry = catalog_cache.get(key, version)
+    if entry is None:
+        body, next_cursor = await db.run(_query_products, limit, cursor, category, selected)
+        entry = catalog_cache.put(key, body, next_cursor, version)
+    body, etag, next_cursor = entry
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Catalog-Version": version}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.post("/products", response_model=ProductResponse)
 async def add_product(
@@ -38,7 +129,7 @@ async def add_product(
     link: str = Form(...),
     category: str = Form("default"),
     authorized: bool = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: SessionRunner = Depends(get_session_runner)
 ):
     # 1. Save Image
     file_extension = os.path.splitext(image.filename)[1]
@@ -57,7 +148,14 @@ async def add_product(
         print(f"❌ Error saving product image: {e}")
         raise HTTPException(status_code=500, detail="Could not save image file")
         
-    # 2. Create Product Object (DB)
+    # 2. Visual attributes (color, palette, shape), computed once at ingestion
+    attributes = {}
+    try:
+        attributes = await run_in_threadpool(_product_attributes, content)
+    except Exception as e:
+        print(f"⚠️ Could not compute product attributes: {e}")
+
+    # 3. Create Product Object (DB)
     image_url = f"http://localhost:8000/static/products/{file_name}"
     
     new_product = ProductModel(
@@ -67,12 +165,17 @@ async def add_product(
         image=image_url,
         category=category,
         link=link,
-        match="100%"
+        match="100%",
+        **attributes
     )
     
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
+    await db.run(_insert_product, new_product)
+
+    # 4. Embeddings IP-Adapter calculés une fois, par le worker d'inférence
+    try:
+        job_queue.submit("ip_embeds", product_embeddings.compute, new_product.id, image_url)
+    except QueueFullError:
+        print(f"⚠️ Inference queue full, embeddings of {new_product.id} left for backfill")
     
     return new_product
 
@@ -80,13 +183,12 @@ async def add_product(
 async def delete_product(
     product_id: str, 
     authorized: bool = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: SessionRunner = Depends(get_session_runner)
 ):
-    product = db.query(ProductModel).filter(ProductModel.id == product_id).first()
-    if not product:
+    found, embeds_path = await db.run(_delete_product, product_id)
+    if not found:
         raise HTTPException(status_code=404, detail="Product not found")
         
-    db.delete(product)
-    db.commit()
+    product_embeddings.delete(embeds_path)
     
     return {"message": "Product deleted"}
@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse, JSONResponse, FileResponse
+import os
+from ..services.model_registry import model_registry
+from ..services.adapter_registry import adapter_registry
+from ..services.prompt_cache import prompt_cache
+from ..services.metrics import metrics
+from ..services.job_queue import job_queue
+from ..services.image_utils import canny_cache
+from ..services.vision_service import detection_cache
+from ..services.image_fetcher import image_fetcher
+from ..services.catalog_cache import catalog_cache
+from ..services.profiler import profile_store
+from .auth import verify_admin
+
+router = APIRouter()
+
+@router.get("/models")
+async def get_resident_models():
+    """Modèles résidents : mémoire par modèle, composants partagés, budget et évictions."""
+    return model_registry.report()
+
+@router.get("/adapters")
+async def get_adapters():
+    """Adapters chargés et actifs par pipeline (IP-Adapter, LoRA de style)."""
+    return {"pipelines": adapter_registry.report()}
+
+@router.get("/prompts/cache")
+async def get_prompt_cache_stats():
+    """Statistiques du cache d'embeddings texte (text encoder CLIP)."""
+    return prompt_cache.stats()
+
+def _cache_stats():
+    """(nom, hits, misses, hit_rate) de chaque cache (les hits disque comptent comme hits)."""
+    caches = [canny_cache, detection_cache, prompt_cache, image_fetcher.cache]
+    rows = []
+    for cache in caches:
+        stats = cache.stats()
+        rows.append((stats["name"], stats["hits"] + stats["disk_hits"], stats["misses"], stats["hit_rate"]))
+    stats = catalog_cache.stats()
+    rows.append(("catalog", stats["hits"], stats["misses"], stats["hit_rate"]))
+    return rows
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Métriques au format texte Prometheus : durées par étape et par route,
+    profondeur de la file, mémoire des modèles résidents, taux de succès des caches.
+    """
+    queue = job_queue.stats()
+    models = model_registry.report()
+    caches = _cache_stats()
+    gauges = [
+        ("job_queue_depth", "Jobs waiting in the inference queue.", "gauge", [({}, queue["queue_depth"])]),
+        ("job_queue_worker_alive", "Inference worker thread alive (1/0).", "gauge", [({}, int(queue["worker_alive"]))]),
+        ("jobs_total", "Finished inference jobs by outcome.", "counter", [
+            ({"status": status}, queue[status]) for status in ("completed", "failed", "cancelled")
+        ]),
+        ("model_resident_bytes", "Memory held by resident models.", "gauge", [
+            ({"model": model["name"]}, model["bytes"]) for model in models["models"]
+        ]),
+        ("models_resident_bytes_total", "Memory held by all resident models (shared components counted once).",
+         "gauge", [({}, models["resident_bytes"])]),
+        ("model_evictions_total", "Models evicted to stay under the memory budget.", "counter",
+         [({}, models["evictions"])]),
+        ("cache_hits_total", "Cache hits (memory + disk).", "counter",
+         [({"cache": name}, hits) for name, hits, _, _ in caches]),
+        ("cache_misses_total", "Cache misses.", "counter",
+         [({"cache": name}, misses) for name, _, misses, _ in caches]),
+        ("cache_hit_ratio", "Cache hit ratio since startup.", "gauge",
+         [({"cache": name}, rate) for name, _, _, rate in caches]),
+    ]
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@router.get("/profiles")
+async def list_profiles(authorized: bool = Depends(verify_admin)):
+    """Profils récents (requêtes avec X-Lumina-Profile: 1 ou échantillonnées), du plus récent au plus ancien."""
+    return {"profiles": profile_store.list()}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, authorized: bool = Depends(verify_admin)):
+    """Détail d'un profil : résumés cProfile (et torch) de chaque exécution dans le worker."""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    data = profile.to_dict(detail=True)
+    data["files"] = sorted(profile_store.files(profile))
+    return data
+
+@router.get("/profiles/{profile_id}/files/{name}")
+async def download_profile_file(profile_id: str, name: str, authorized: bool = Depends(verify_admin)):
+    """Fichier brut : `<n>.pstats` (snakeviz, pstats) ou `<n>.trace` (chrome://tracing, Perfetto)."""
+    profile = profile_store.get(profile_id)
+    path = profile_store.files(profile).get(name) if profile is not None else None
+    if path is None:
+        return JSONResponse({"error": "Profile file not found"}, status_code=404)
+    return FileResponse(path, filename=os.path.basename(path))
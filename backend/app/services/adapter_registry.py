@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import weakref
+
+# --- Configuration Adapters ---
+# IP-Adapter standard pour SD1.5
+IP_ADAPTER_REPO = "h94/IP-Adapter"
+IP_ADAPTER_SUBFOLDER = "models"
+IP_ADAPTER_WEIGHTS = "ip-adapter_sd15.bin"
+# Augmenté à 0.9 pour une meilleure fidélité produit
+IP_ADAPTER_SCALE = 0.9
+# LoRA de style par preset (clé de STYLE_PROMPTS), ex :
+# STYLE_LORAS='{"japandi": "loras/japandi.safetensors", "cyber": "user/cyberpunk-lora"}'
+STYLE_LORAS = json.loads(os.getenv("STYLE_LORAS", "{}"))
+
+MODE_STAGING = "staging"
+MODE_CLEANING = "cleaning"
+
+
+class _PipelineAdapters:
+    def __init__(self, name):
+        self.name = name
+        self.ip_adapter = False
+        self.ip_scale = None
+        self.loras = set()
+        self.active_loras = ()
+
+
+class AdapterRegistry:
+    """
+    Etat des adapters par pipeline : chaque adapter (IP-Adapter, LoRA de style)
+    est chargé une seule fois ; passer du staging au nettoyage, ou d'un style à
+    l'autre, ne fait que changer les poids actifs (aucune lecture disque/réseau).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # L'état disparaît avec le pipeline (éviction par le registre de modèles)
+        self._state = weakref.WeakKeyDictionary()
+
+    def _get(self, pipe, name=None):
+        state = self._state.get(pipe)
+        if state is None:
+            state = _PipelineAdapters(name or type(pipe).__name__)
+            self._state[pipe] = state
+        return state
+
+    # --- IP-Adapter ---
+    def ensure_ip_adapter(self, pipe, device, name=None):
+        """Charge l'IP-Adapter sur ce pipeline s'il ne l'est pas déjà. Retourne True si chargé à l'instant."""
+        import torch
+
+        with self._lock:
+            state = self._get(pipe, name)
+            if state.ip_adapter:
+                return False
+            print("🔌 Loading IP-Adapter...")
+            pipe.load_ip_adapter(IP_ADAPTER_REPO, subfolder=IP_ADAPTER_SUBFOLDER, weight_name=IP_ADAPTER_WEIGHTS)
+            # FIX: S'assurer que l'image_encoder est sur le bon device/dtype
+            if device == "cuda":
+                pipe.image_encoder.to(device, dtype=torch.float16)
+            state.ip_adapter = True
+            state.ip_scale = None
+            print("✅ IP-Adapter loaded!")
+            return True
+
+    def has_ip_adapter(self, pipe):
+        with self._lock:
+            state = self._state.get(pipe)
+            return bool(state and state.ip_adapter)
+
+    def set_mode(self, pipe, mode):
+        """
+        Staging : IP-Adapter actif (IP_ADAPTER_SCALE).
+        Nettoyage : échelle 0, l'adapter reste chargé pour le prochain staging.
+        """
+        with self._lock:
+            state = self._state.get(pipe)
+            if state is None or not state.ip_adapter:
+                return
+            scale = IP_ADAPTER_SCALE if mode == MODE_STAGING else 0.0
+            if state.ip_scale != scale:
+                pipe.set_ip_adapter_scale(scale)
+                state.ip_scale = scale
+
+    def neutral_ip_embeds(self, pipe, device, dtype, batch_size=1):
+        """
+        Embeddings nuls (négatif + positif) pour appeler un pipeline dont l'UNet a
+        l'IP-Adapter chargé sans image produit (mode nettoyage, échelle 0).
+        """
+        import torch
+
+        dim = pipe.image_encoder.config.projection_dim
+        return [torch.zeros(2 * batch_size, 1, dim, device=device, dtype=dtype)]
+
+    # --- LoRA de style ---
+    def activate_loras(self, pipe, names, name=None):
+        """
+        Active exactement les LoRA `names` (chargées à la première utilisation),
+        désactive les autres. Sans changement, ne fait rien.
+        """
+        names = tuple(n for n in names if n in STYLE_LORAS)
+        with self._lock:
+            state = self._get(pipe, name)
+            if names == state.active_loras:
+                return
+            for lora in names:
+                if lora not in state.loras:
+                    print(f"🎨 Loading style LoRA {lora}...")
+                    pipe.load_lora_weights(STYLE_LORAS[lora], adapter_name=lora)
+                    state.loras.add(lora)
+            if names:
+                pipe.enable_lora()
+                pipe.set_adapters(list(names))
+            elif state.loras:
+                pipe.disable_lora()
+            state.active_loras = names
+
+    def active_loras_for(self, text_encoder):
+        """
+        LoRA actives sur un text encoder, tous pipelines confondus (un composant
+        partagé porte les LoRA activées par n'importe lequel de ses pipelines).
+        """
+        with self._lock:
+            names = set()
+            for pipe, state in self._state.items():
+                if getattr(pipe, "text_encoder", None) is text_encoder:
+                    names.update(state.active_loras)
+            return tuple(sorted(names))
+
+    def report(self):
+        with self._lock:
+            return [
+                {
+                    "pipeline": state.name,
+                    "ip_adapter": state.ip_adapter,
+                    "ip_adapter_scale": state.ip_scale,
+                    "loras": sorted(state.loras),
+                    "active_loras": list(state.active_loras),
+                }
+                for state in self._state.values()
+            ]
+
+
+# Singleton instance
+adapter_registry = AdapterRegistry()
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+
+def content_key(data, *params):
+    """Clé de cache : hash SHA-256 du contenu + paramètres de traitement."""
+    digest = data if isinstance(data, str) else hashlib.sha256(data).hexdigest()
+    if not params:
+        return digest
+    suffix = "_".join(str(p) for p in params)
+    return f"{digest}_{hashlib.sha1(suffix.encode()).hexdigest()[:12]}"
+
+
+class TieredCache:
+    """
+    Cache LRU à deux niveaux :
+    - mémoire, borné en octets (size_of(value)) ;
+    - disque optionnel, borné en octets, éviction LRU (ordre d'accès).
+    Le niveau disque nécessite serialize(value) -> bytes et deserialize(bytes) -> value.
+    """
+
+    def __init__(self, name, max_memory_bytes, size_of, disk_dir=None, max_disk_bytes=0,
+                 serialize=None, deserialize=None, extension="bin"):
+        self.name = name
+        self.max_memory_bytes = max_memory_bytes
+        self.size_of = size_of
+        self.disk_dir = disk_dir if max_disk_bytes > 0 else None
+        self.max_disk_bytes = max_disk_bytes
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.extension = extension
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, size)
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> size
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    # --- API ---
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            on_disk = key in self._disk
+
+        if on_disk:
+            value = self._read_disk(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store_memory(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._store_memory(key, value)
+        if self.disk_dir:
+            self._write_disk(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "disk_items": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes,
+        }
+
+    # --- Mémoire ---
+    def _store_memory(self, key, value):
+        size = self.size_of(value)
+        if size > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[1]
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    # --- Disque ---
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.{self.extension}")
+
+    def _load_disk_index(self):
+        # Reconstruit l'ordre LRU à partir des dates de modification (touchées à chaque hit)
+        entries = []
+        for filename in os.listdir(self.disk_dir):
+            if not filename.endswith(f".{self.extension}"):
+                continue
+            path = os.path.join(self.disk_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, filename[: -len(self.extension) - 1], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            value = self.deserialize(data)
+        except Exception:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return value
+
+    def _write_disk(self, key, value):
+        try:
+            data = self.serialize(value)
+        except Exception as e:
+            print(f"⚠️ Cache {self.name}: could not serialize entry: {e}")
+            return
+        if len(data) > self.max_disk_bytes:
+            return
+
+        # Ecriture atomique : fichier temporaire + rename
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Cache {self.name}: could not write entry: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        evicted = []
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_bytes -= previous
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                evicted_key, evicted_size = self._disk.popitem(last=False)
+                self._disk_bytes -= evicted_size
+                evicted.append(evicted_key)
+        for evicted_key in evicted:
+            try:
+                os.remove(self._path(evicted_key))
+            except OSError:
+                pass
@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlalchemy import func, literal_column
+from ..models import Product
+
+# Nombre de réponses différentes (combinaisons de paramètres) gardées en mémoire
+CATALOG_CACHE_SIZE = 256
+
+
+def catalog_version(db):
+    """
+    Version du catalogue, lue en base (identique pour tous les workers uvicorn) :
+    dernier rowid + nombre de produits (suppressions) + dernière écriture (rowid réutilisé).
+    Trois sous-requêtes scalaires : chacune garde son raccourci SQLite (max par l'index,
+    count par le b-tree) ; réunies dans un seul agrégat, elles parcourraient tout l'index.
+    """
+    def scalar(column):
+        return db.query(column).select_from(Product).scalar_subquery()
+
+    max_rowid, count, max_updated = db.query(
+        scalar(func.max(literal_column("products.rowid"))),
+        scalar(func.count()),
+        scalar(func.max(Product.updated_at)),
+    ).one()
+    return f"{max_rowid or 0}.{count}.{int((max_updated or 0) * 1000)}"
+
+
+class CatalogCache:
+    """
+    Cache des réponses sérialisées de GET /products, indexé par la version du catalogue
+    lue en base (`catalog_version`) : une écriture faite par n'importe quel processus
+    change la version, les entrées des versions précédentes ne sont plus servies
+    et sortent du LRU.
+    """
+
+    def __init__(self, max_entries=CATALOG_CACHE_SIZE):
+        self.max_entries = max_entries
+        # Dernière version vue (statistiques)
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, version):
+        """Retourne (body, etag, next_cursor) ou None."""
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, next_cursor, version):
+        """Stocke une réponse calculée pour `version` (lue avant la requête de la page)."""
+        etag = f'"{version}-{hashlib.sha1(body).hexdigest()[:20]}"'
+        entry = (body, etag, next_cursor)
+        with self._lock:
+            self.version = version
+            self._entries[(version, key)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Singleton instance
+catalog_cache = CatalogCache()
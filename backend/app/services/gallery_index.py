@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from sqlalchemy import func
+from ..database import SessionLocal
+from ..models import GalleryImage
+from .thumbnails import thumbnail_urls
+
+GALLERY_DIR = "static/gallery"
+GALLERY_URL = "http://localhost:8000/static/gallery"
+GALLERY_KINDS = ("generated", "inpainted")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def gallery_kind(filename):
+    """generated_xxx.png -> 'generated', inpainted_xxx.png -> 'inpainted'."""
+    prefix = filename.split("_", 1)[0]
+    return prefix if prefix in GALLERY_KINDS else "other"
+
+
+class GalleryIndex:
+    """
+    Index SQLite des images de la galerie, alimenté à chaque sauvegarde.
+    Le dossier n'est parcouru qu'une seule fois (backfill initial si l'index est vide).
+    """
+
+    def __init__(self, directory=GALLERY_DIR):
+        self.directory = directory
+        self._backfilled = False
+        self._lock = threading.Lock()
+
+    def add(self, filename, created_at=None):
+        """Enregistre une image qui vient d'être sauvegardée dans la galerie."""
+        # Le backfill doit précéder le premier ajout (sinon l'index ne serait plus vide)
+        self.ensure_backfilled()
+        created_at = created_at or time.time()
+        db = SessionLocal()
+        try:
+            if db.query(GalleryImage.id).filter(GalleryImage.filename == filename).first() is not None:
+                return
+            db.add(GalleryImage(
+                filename=filename,
+                kind=gallery_kind(filename),
+                created_at=created_at,
+                thumbnail_sizes="",
+                updated_at=created_at
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Could not index gallery image {filename}: {e}")
+        finally:
+            db.close()
+
+    def set_thumbnails(self, filename, sizes):
+        """Marque les miniatures d'une image comme disponibles."""
+        db = SessionLocal()
+        try:
+            db.query(GalleryImage).filter(GalleryImage.filename == filename).update({
+                GalleryImage.thumbnail_sizes: ",".join(str(size) for size in sizes),
+                GalleryImage.updated_at: time.time()
+            })
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Could not update thumbnails of {filename}: {e}")
+        finally:
+            db.close()
+
+    def ensure_backfilled(self):
+        """Indexe les fichiers existants (une seule fois, si la table est vide)."""
+        if self._backfilled:
+            return
+        with self._lock:
+            if self._backfilled:
+                return
+            db = SessionLocal()
+            try:
+                if db.query(GalleryImage.id).first() is None and os.path.isdir(self.directory):
+                    entries = []
+                    for filename in os.listdir(self.directory):
+                        if filename.endswith(IMAGE_EXTENSIONS):
+                            mtime = os.path.getmtime(os.path.join(self.directory, filename))
+                            entries.append((mtime, filename))
+                    # Ordre chronologique : les ids suivent l'ancienneté
+                    for mtime, filename in sorted(entries):
+                        db.add(GalleryImage(
+                            filename=filename,
+                            kind=gallery_kind(filename),
+                            created_at=mtime,
+                            thumbnail_sizes="",
+                            updated_at=mtime
+                        ))
+                    db.commit()
+                    print(f"🖼️ Gallery index backfilled with {len(entries)} images")
+                self._backfilled = True
+            finally:
+                db.close()
+
+    def version(self, db):
+        """
+        Identifiant de version de la galerie pour les ETags :
+        dernier id inséré + dernière mise à jour (miniatures). Deux lectures d'index, en
+        sous-requêtes scalaires : un seul agrégat max(a), max(b) parcourrait toute la table.
+        """
+        max_id, max_updated = db.query(
+            db.query(func.max(GalleryImage.id)).scalar_subquery(),
+            db.query(func.max(GalleryImage.updated_at)).scalar_subquery(),
+        ).one()
+        return f"{max_id or 0}.{int((max_updated or 0) * 1000)}"
+
+    def page(self, db, limit, cursor=None, kind=None):
+        """
+        Pagination par curseur (keyset) : plus récent en premier.
+        Retourne (images, next_cursor).
+        """
+        query = db.query(GalleryImage)
+        if kind:
+            query = query.filter(GalleryImage.kind == kind)
+        if cursor is not None:
+            query = query.filter(GalleryImage.id < cursor)
+        rows = query.order_by(GalleryImage.id.desc()).limit(limit + 1).all()
+
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        images = [
+            {
+                "id": row.filename,
+                "url": f"{GALLERY_URL}/{row.filename}",
+                "kind": row.kind,
+                "created_at": row.created_at,
+                "thumbnails": thumbnail_urls(
+                    row.filename,
+                    [int(size) for size in row.thumbnail_sizes.split(",")] if row.thumbnail_sizes else []
+                )
+            }
+            for row in rows[:limit]
+        ]
+        return images, next_cursor
+
+
+# Singleton instance
+gallery_index = GalleryIndex()
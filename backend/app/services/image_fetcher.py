@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import re
+import time
+import httpx
+from .cache import TieredCache, content_key
+
+# --- Configuration Téléchargements ---
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(10 * 1024 * 1024)))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "10"))
+# Durée de fraîcheur par défaut si le serveur n'envoie pas de Cache-Control max-age
+FETCH_DEFAULT_TTL = int(os.getenv("FETCH_DEFAULT_TTL", "3600"))
+FETCH_CACHE_MEMORY_MB = int(os.getenv("FETCH_CACHE_MEMORY_MB", "32"))
+FETCH_CACHE_DISK_MB = int(os.getenv("FETCH_CACHE_DISK_MB", "256"))
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "cache/remote_images")
+# User-Agent navigateur pour éviter 403/404 sur certains sites
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class FetchError(Exception):
+    """Téléchargement impossible (statut HTTP, taille, timeout...)."""
+
+
+def _serialize(entry):
+    meta, body = entry
+    return json.dumps(meta).encode("utf-8") + b"\n" + body
+
+
+def _deserialize(data):
+    meta, body = data.split(b"\n", 1)
+    return json.loads(meta.decode("utf-8")), body
+
+
+class ImageFetcher:
+    """
+    Téléchargement des images produits distantes :
+    - connexions keep-alive partagées (pool httpx), timeouts et taille max ;
+    - cache mémoire + disque, revalidé via ETag / Last-Modified une fois périmé ;
+    - requêtes concurrentes sur la même URL fusionnées en un seul téléchargement.
+    """
+
+    def __init__(self):
+        self.cache = TieredCache(
+            "remote_images",
+            max_memory_bytes=FETCH_CACHE_MEMORY_MB * 1024 * 1024,
+            size_of=lambda entry: len(entry[1]),
+            disk_dir=FETCH_CACHE_DIR,
+            max_disk_bytes=FETCH_CACHE_DISK_MB * 1024 * 1024,
+            serialize=_serialize,
+            deserialize=_deserialize,
+            extension="bin",
+        )
+        self._client = None
+        self._loop = None
+        self._inflight = {}
+
+    # --- Cycle de vie (lié à l'event loop de l'API) ---
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._client = self._new_client()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+    @staticmethod
+    def _new_client():
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=FETCH_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(FETCH_TIMEOUT),
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT}
+        )
+
+    # --- API ---
+    async def fetch(self, url):
+        """Octets de l'image (depuis le cache ou le réseau)."""
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url, self._client))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        # shield : l'annulation d'un appelant n'annule pas le téléchargement partagé
+        return await asyncio.shield(task)
+
+    def fetch_sync(self, url):
+        """
+        Version bloquante pour les threads (worker d'inférence, scripts).
+        Ne jamais appeler depuis l'event loop lui-même.
+        """
+        if self._loop is not None and self._loop.is_running():
+            return asyncio.run_coroutine_threadsafe(self.fetch(url), self._loop).result(FETCH_TIMEOUT * 2)
+        return asyncio.run(self._fetch_standalone(url))
+
+    async def _fetch_standalone(self, url):
+        async with self._new_client() as client:
+            return await self._fetch(url, client)
+
+    async def _fetch(self, url, client):
+        key = content_key(url.encode("utf-8"))
+        cached = await asyncio.to_thread(self.cache.get, key)
+        headers = {}
+        if cached is not None:
+            meta, body = cached
+            if meta["expires_at"] > time.time():
+                return body
+            # Périmé : requête conditionnelle
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        if client is None:
+            raise FetchError("Image fetcher is not started")
+
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    body = cached[1]
+                else:
+                    if response.status_code >= 400:
+                        raise FetchError(f"HTTP {response.status_code} for {url}")
+                    declared = int(response.headers.get("content-length") or 0)
+                    if declared > FETCH_MAX_BYTES:
+                        raise FetchError(f"Image too large ({declared} bytes)")
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > FETCH_MAX_BYTES:
+                            raise FetchError(f"Image too large (> {FETCH_MAX_BYTES} bytes)")
+                        chunks.append(chunk)
+                    body = b"".join(chunks)
+                meta = self._meta(response.headers, cached[0] if cached else {})
+        except httpx.HTTPError as e:
+            raise FetchError(f"Download failed for {url}: {e}") from e
+
+        await asyncio.to_thread(self.cache.put, key, (meta, body))
+        return body
+
+    @staticmethod
+    def _meta(headers, previous):
+        match = _MAX_AGE.search(headers.get("cache-control", ""))
+        ttl = int(match.group(1)) if match else FETCH_DEFAULT_TTL
+        return {
+            "etag": headers.get("etag") or previous.get("etag"),
+            "last_modified": headers.get("last-modified") or previous.get("last_modified"),
+            "expires_at": time.time() + ttl,
+        }
+
+
+# Singleton instance
+image_fetcher = ImageFetcher()
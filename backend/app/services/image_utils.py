@@ -3,29 +3,90 @@ import numpy as np
 import base64
 from PIL import Image
 import io
+import os
+from .cache import TieredCache, content_key
+from .metrics import metrics
 
-def process_canny(image_path):
-    """Applique un filtre Canny sur l'image pour obtenir les contours."""
-    image = cv2.imread(image_path)
+# --- Cache Canny ---
+# Les contours sont indexés par hash du fichier uploadé + paramètres de prétraitement :
+# re-styler la même photo ne refait ni décodage ni détection de contours.
+CANNY_CACHE_MEMORY_MB = int(os.getenv("CANNY_CACHE_MEMORY_MB", "64"))
+CANNY_CACHE_DISK_MB = int(os.getenv("CANNY_CACHE_DISK_MB", "512"))
+CANNY_CACHE_DIR = os.getenv("CANNY_CACHE_DIR", "cache/canny")
+
+def _encode_edges(edges):
+    # PNG : sans perte et très compact pour une carte de contours binaire
+    ok, buffer = cv2.imencode(".png", edges)
+    if not ok:
+        raise ValueError("PNG encoding failed")
+    return buffer.tobytes()
+
+def _decode_edges(data):
+    edges = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if edges is None:
+        raise ValueError("PNG decoding failed")
+    edges.flags.writeable = False
+    return edges
+
+canny_cache = TieredCache(
+    "canny",
+    max_memory_bytes=CANNY_CACHE_MEMORY_MB * 1024 * 1024,
+    size_of=lambda edges: edges.nbytes,
+    disk_dir=CANNY_CACHE_DIR,
+    max_disk_bytes=CANNY_CACHE_DISK_MB * 1024 * 1024,
+    serialize=_encode_edges,
+    deserialize=_decode_edges,
+    extension="png",
+)
+
+def process_canny(image_path, low_threshold=100, high_threshold=200, max_size=1024):
+    """Applique un filtre Canny sur l'image pour obtenir les contours (max_size=None : pleine résolution)."""
+    try:
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+    except OSError:
+        return None
+    return process_canny_bytes(image_bytes, low_threshold, high_threshold, max_size)
+
+def process_canny_bytes(image_bytes, low_threshold=100, high_threshold=200, max_size=1024, digest=None):
+    """
+    Canny à partir des octets de l'image, avec cache (mémoire + disque).
+    `digest` permet de réutiliser un hash SHA-256 déjà calculé.
+    Le tableau retourné est en lecture seule (partagé par le cache).
+    """
+    key = content_key(digest or image_bytes, low_threshold, high_threshold, max_size)
+    edges = canny_cache.get(key)
+    if edges is not None:
+        return edges
+
+    image = decode_image_bytes(image_bytes)
     if image is None:
         return None
     
-    # Convertir en niveaux de gris
-    image = resize_image(image, max_size=1024) # Redimensionner pour éviter OOM
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Appliquer Canny
-    edges = cv2.Canny(gray, 100, 200)
+    with metrics.stage("canny"):
+        # Convertir en niveaux de gris
+        image = resize_image(image, max_size=max_size) # Redimensionner pour éviter OOM
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        # Appliquer Canny
+        edges = cv2.Canny(gray, low_threshold, high_threshold)
     
     # Inverser les couleurs (fond blanc, traits noirs) pour l'affichage si besoin,
     # mais pour ControlNet on garde souvent fond noir traits blancs.
     # Ici on retourne l'image telle quelle (numpy array)
+    edges.flags.writeable = False
+    canny_cache.put(key, edges)
     return edges
 
+def decode_image_bytes(image_bytes):
+    """Décode des octets (PNG/JPEG/...) en tableau numpy BGR (None si invalide)."""
+    with metrics.stage("decode"):
+        return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
 def resize_image(image, max_size=1024):
-    """Redimensionne l'image pour ne pas dépasser max_size tout en gardant le ratio."""
+    """Redimensionne l'image pour ne pas dépasser max_size tout en gardant le ratio (None : inchangée)."""
     h, w = image.shape[:2]
-    if h > max_size or w > max_size:
+    if max_size and (h > max_size or w > max_size):
         scale = max_size / max(h, w)
         new_h, new_w = int(h * scale), int(w * scale)
         image = cv2.resize(image, (new_w, new_h))
@@ -44,56 +105,210 @@ def image_to_base64(image):
     image.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode("utf-8")
 
+# --- Inpainting recadré sur le masque ---
+def mask_bbox(mask, threshold=127):
+    """Boîte (gauche, haut, droite, bas) des pixels du masque (PIL, mode L) au-dessus du seuil. None si vide."""
+    return mask.point(lambda v: 255 if v > threshold else 0).getbbox()
+
+def padded_crop_box(bbox, image_size, padding=0.25, min_padding=32):
+    """Agrandit la boîte du masque d'une marge de contexte (fraction du plus grand côté), bornée à l'image."""
+    left, top, right, bottom = bbox
+    width, height = image_size
+    pad = max(min_padding, int(max(right - left, bottom - top) * padding))
+    return (max(0, left - pad), max(0, top - pad), min(width, right + pad), min(height, bottom + pad))
+
+def native_size(size, target=512, multiple=8):
+    """Taille de travail du modèle : plus grand côté = target, proportions conservées, multiples de 8."""
+    width, height = size
+    scale = target / max(width, height)
+    return (
+        max(multiple, round(width * scale / multiple) * multiple),
+        max(multiple, round(height * scale / multiple) * multiple)
+    )
+
+def feathered_paste(original, patch, mask, box, feather=12):
+    """
+    Recolle `patch` (de la taille de `box`) dans une copie de `original`.
+    Le masque est dilaté puis flouté de `feather` px : la zone masquée est
+    entièrement remplacée et la couture se fond dans la photo d'origine.
+    """
+    from PIL import ImageFilter
+
+    alpha = mask.crop(box)
+    if feather > 0:
+        alpha = alpha.filter(ImageFilter.MaxFilter(2 * (feather // 2) + 1))
+        alpha = alpha.filter(ImageFilter.GaussianBlur(feather / 2))
+    result = original.copy()
+    result.paste(patch, box[:2], alpha)
+    return result
+
+# --- Génération par tuiles ---
+def _tile_starts(length, tile, overlap, align):
+    """
+    Départs régulièrement espacés (multiples de `align`) : tous les chevauchements sont
+    égaux, et au moins égaux à `overlap` (arrondi à `align` près).
+    """
+    if length <= tile:
+        return [0]
+    count = -(-(length - overlap) // (tile - overlap))
+    span = length - tile
+    return [round(i * span / (count - 1) / align) * align for i in range(count)]
+
+def tile_boxes(size, tile_size, overlap, align=8):
+    """
+    Boîtes (gauche, haut, droite, bas) de tuiles chevauchantes couvrant une image (largeur, hauteur).
+    Positions multiples de `align` (1 pixel latent = 8 pixels).
+    """
+    width, height = size
+    return [
+        (left, top, min(width, left + tile_size), min(height, top + tile_size))
+        for top in _tile_starts(height, tile_size, overlap, align)
+        for left in _tile_starts(width, tile_size, overlap, align)
+    ]
+
+def tile_weights(box, boxes):
+    """
+    Poids de fondu d'une tuile (hauteur, largeur, 1) : sur chaque bord intérieur, rampe
+    linéaire sur le chevauchement réel avec la tuile voisine (`boxes` : toutes les tuiles),
+    1 ailleurs (bords de l'image compris). Les poids de deux voisines se complètent.
+    """
+    left, top, right, bottom = box
+
+    def ramp(start, end, neighbours):
+        weights = np.ones(end - start, dtype=np.float32)
+        # Voisine précédente : elle finit dans la tuile ; suivante : elle y commence
+        previous_end = max((e for s, e in neighbours if s < start < e), default=start)
+        next_start = min((s for s, e in neighbours if start < s < end), default=end)
+        if previous_end > start:
+            fade = previous_end - start
+            weights[:fade] = np.linspace(0, 1, fade + 2, dtype=np.float32)[1:-1]
+        if next_start < end:
+            fade = end - next_start
+            weights[-fade:] = np.minimum(weights[-fade:], np.linspace(1, 0, fade + 2, dtype=np.float32)[1:-1])
+        return weights
+
+    rows = ramp(top, bottom, {(t, b) for l, t, r, b in boxes if l == left})
+    columns = ramp(left, right, {(l, r) for l, t, r, b in boxes if t == top})
+    return (rows[:, None] * columns[None, :])[..., None]
+
+# Taille d'analyse des couleurs (pixels) et seuil de luminosité du fond blanc/clair
+COLOR_ANALYSIS_SIZE = 100
+BACKGROUND_LUMINANCE = 230
+
 def get_dominant_color(pil_image):
     """
     Détermine la couleur dominante en ignorant le fond blanc/clair.
     """
     # Redimensionner pour l'analyse
     img = pil_image.copy()
-    img.thumbnail((100, 100))
+    img.thumbnail((COLOR_ANALYSIS_SIZE, COLOR_ANALYSIS_SIZE))
     
     if img.mode != 'RGB':
         img = img.convert('RGB')
         
     data = np.array(img)
-    # Reshape en liste de pixels (N, 3)
-    pixels = data.reshape(-1, 3)
-    
-    # Filtrer les pixels trop clairs (fond blanc probable)
-    # On garde les pixels dont la luminosité moyenne est < 240
-    # (Ou on peut être plus strict si le fond est pur blanc 255)
-    mask = np.mean(pixels, axis=1) < 230
-    filtered_pixels = pixels[mask]
+    # Reshape en liste de pixels (1, N, 3)
+    pixels = data.reshape(1, -1, 3)
+    avg_color, _ = _foreground_stats(pixels)
+    r, g, b = avg_color[0]
     
+    print(f"🎨 Color Analysis - R:{r:.1f} G:{g:.1f} B:{b:.1f}")
+    return classify_colors(avg_color)[0]
+
+def _foreground_stats(pixels, valid=None):
+    """
+    pixels : (n_images, n_pixels, 3), `valid` : pixels réels (n, n_pixels), None = tous
+    (le reste est du remplissage). Filtre les pixels trop clairs (fond blanc probable)
+    et retourne (couleur moyenne de l'objet (n, 3), masque des pixels gardés (n, n_pixels)).
+    """
+    pixels = pixels.astype(np.float32)
+    if valid is None:
+        valid = np.ones(pixels.shape[:2], dtype=bool)
+    # On garde les pixels dont la luminosité moyenne est < 230
+    mask = (pixels.mean(axis=2) < BACKGROUND_LUMINANCE) & valid
     # Si on a tout filtré (image blanche ?), on fallback sur tout
-    if len(filtered_pixels) == 0:
-        filtered_pixels = pixels
-        
+    empty = ~mask.any(axis=1)
+    mask[empty] = valid[empty]
     # Moyenne des pixels restants (l'objet)
-    avg_color = np.mean(filtered_pixels, axis=0)
-    r, g, b = avg_color
-    
-    print(f"🎨 Color Analysis - R:{r:.1f} G:{g:.1f} B:{b:.1f}")
-    
-    # Classification
+    avg = (pixels * mask[..., None]).sum(axis=1) / mask.sum(axis=1, keepdims=True)
+    return avg, mask
+
+def classify_colors(avg_colors):
+    """Classe des couleurs moyennes (n, 3) RGB en noms simples ("black", "red", ... ou "")."""
+    r, g, b = (avg_colors[:, i] for i in range(3))
     # 1. Niveaux de gris (R, G, B proches)
-    if abs(r - g) < 25 and abs(r - b) < 25 and abs(g - b) < 25:
-        if r < 70: return "black" # Seuil augmenté (était 40)
-        if r > 200: return "white"
-        return "grey"
-        
-    # 2. Couleurs
-    if r > g + 30 and r > b + 30:
-        if g > 100: return "orange"
-        return "red"
-    if g > r + 30 and g > b + 30:
-        return "green"
-    if b > r + 30 and b > g + 30:
-        if r > 100: return "purple"
-        return "blue"
-    if r > 150 and g > 150 and b < 100:
-        return "yellow"
-    if r > 100 and g < 100 and b < 100:
-        return "brown"
-        
-    return ""
+    grey = (np.abs(r - g) < 25) & (np.abs(r - b) < 25) & (np.abs(g - b) < 25)
+    conditions = [
+        grey & (r < 70),  # Seuil augmenté (était 40)
+        grey & (r > 200),
+        grey,
+        # 2. Couleurs
+        (r > g + 30) & (r > b + 30) & (g > 100),
+        (r > g + 30) & (r > b + 30),
+        (g > r + 30) & (g > b + 30),
+        (b > r + 30) & (b > g + 30) & (r > 100),
+        (b > r + 30) & (b > g + 30),
+        (r > 150) & (g > 150) & (b < 100),
+        (r > 100) & (g < 100) & (b < 100),
+    ]
+    choices = ["black", "white", "grey", "orange", "red", "green", "purple", "blue", "yellow", "brown"]
+    return np.select(conditions, choices, default="").tolist()
+
+def shape_class(aspect_ratio):
+    """Classe de forme d'un produit à partir de son ratio largeur / hauteur."""
+    # Seuil abaissé à 1.2 pour mieux détecter les canapés larges
+    if aspect_ratio > 1.2:
+        return "wide"
+    if aspect_ratio < 0.8:
+        return "tall"
+    return "square"
+
+def compute_product_attributes(pil_images, palette_size=3):
+    """
+    Attributs visuels de plusieurs produits en une passe NumPy vectorisée :
+    couleur dominante, palette (hex), ratio et classe de forme.
+    """
+    if not pil_images:
+        return []
+    ratios = [img.size[0] / img.size[1] for img in pil_images]
+    # Même réduction que get_dominant_color (thumbnail, ratio conservé), puis remplissage
+    # jusqu'à une taille fixe pour empiler les images : (n, P, 3) + masque des pixels réels
+    size = COLOR_ANALYSIS_SIZE
+    pixels = np.zeros((len(pil_images), size, size, 3), dtype=np.uint8)
+    valid = np.zeros((len(pil_images), size, size), dtype=bool)
+    for i, img in enumerate(pil_images):
+        small = img.copy()
+        small.thumbnail((size, size))
+        data = np.asarray(small.convert("RGB"))
+        height, width = data.shape[:2]
+        pixels[i, :height, :width] = data
+        valid[i, :height, :width] = True
+    pixels = pixels.reshape(len(pil_images), -1, 3)
+    valid = valid.reshape(len(pil_images), -1)
+
+    avg, mask = _foreground_stats(pixels, valid)
+    colors = classify_colors(avg)
+
+    # Palette : histogramme 3 bits / canal (512 teintes) des pixels de l'objet, par image
+    quantized = (pixels >> 5).astype(np.int64)
+    codes = quantized[..., 0] * 64 + quantized[..., 1] * 8 + quantized[..., 2]
+    codes += np.arange(len(pil_images))[:, None] * 512
+    histograms = np.bincount(codes[mask], minlength=len(pil_images) * 512).reshape(-1, 512)
+    top = np.argsort(-histograms, axis=1, kind="stable")[:, :palette_size]
+
+    attributes = []
+    for i, ratio in enumerate(ratios):
+        palette = []
+        for code in top[i]:
+            if histograms[i, code] == 0:
+                break
+            # Centre du bin quantifié
+            rgb = [((code >> shift) & 7) * 32 + 16 for shift in (6, 3, 0)]
+            palette.append("#{:02x}{:02x}{:02x}".format(*rgb))
+        attributes.append({
+            "dominant_color": colors[i],
+            "color_palette": ",".join(palette),
+            "aspect_ratio": ratio,
+            "shape_class": shape_class(ratio),
+        })
+    return attributes
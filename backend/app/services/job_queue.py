@@ -0,0 +1,370 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from .profiler import current_profile, capture
+
+# --- Configuration File d'attente ---
+# Taille max de la file : au-delà, les nouvelles soumissions sont refusées (503)
+JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", "16"))
+# Durée de conservation des jobs terminés (pour le polling du statut)
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+# Fenêtre glissante utilisée pour les statistiques latence / débit
+STATS_WINDOW = 500
+
+
+class QueueFullError(Exception):
+    """La file d'inférence est pleine."""
+
+
+class JobCancelledError(Exception):
+    """Le job a été annulé par le client."""
+
+
+class Job:
+    def __init__(self, kind, fn, args, kwargs, batch_key=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Les jobs de même kind et même batch_key peuvent être exécutés ensemble
+        self.batch_key = batch_key
+        self.batch_size = 1
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = Future()
+        # Avancement publié par le pipeline (callback par step) et dernier aperçu (data URL)
+        self.progress = None
+        self.preview = None
+        self._cancel = threading.Event()
+        # Profil de la requête qui a soumis le job (contextvar de l'event loop), None hors profilage
+        self.profile = current_profile.get()
+
+    @property
+    def done(self):
+        return self.status in ("done", "error", "cancelled")
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def report_progress(self, step, total_steps, preview=None):
+        self.progress = {"step": step, "total_steps": total_steps}
+        if preview is not None:
+            self.preview = preview
+
+    def to_dict(self):
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "batch_size": self.batch_size,
+        }
+        if self.progress is not None:
+            data["progress"] = self.progress
+        if self.status == "done":
+            data["result"] = self.result
+        if self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    File d'attente bornée + worker d'inférence dédié.
+    Les routes soumettent un job et récupèrent un id immédiatement ;
+    l'inférence tourne dans un thread séparé pour ne pas bloquer l'event loop.
+
+    Micro-batching : pour les kinds enregistrés via register_batch_handler,
+    le worker regroupe les jobs compatibles (même batch_key) arrivés dans une
+    fenêtre de max_wait secondes, jusqu'à max_batch_size, et les exécute en un
+    seul appel.
+    """
+
+    def __init__(self, maxsize=JOB_QUEUE_MAX_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        # Jobs déjà retirés de la file mais incompatibles avec le batch en cours
+        self._deferred = deque()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._worker = None
+        self._current = None
+        # Jobs en cours d'exécution (batch compris), pour les callbacks de progression
+        self._running = []
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._batch_handlers = {}
+        self._batch_sizes = {}
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self._finish_times = deque(maxlen=STATS_WINDOW)
+
+    def register_batch_handler(self, kind, handler, max_batch_size, max_wait):
+        """
+        handler(list_of_args) -> liste de résultats (un par job, dans l'ordre).
+        Un élément peut être une Exception : seul le job correspondant échoue.
+        """
+        self._batch_handlers[kind] = (handler, max(1, int(max_batch_size)), max(0.0, float(max_wait)))
+
+    def start(self):
+        """Démarre le worker d'inférence (une seule fois)."""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+            self._worker.start()
+            print("🧵 Inference worker started")
+
+    def submit(self, kind, fn, *args, batch_key=None, **kwargs):
+        """Ajoute un job à la file. Lève QueueFullError si la file est pleine."""
+        self.start()
+        job = Job(kind, fn, args, kwargs, batch_key=batch_key)
+        with self._lock:
+            # Les jobs mis de côté par le micro-batching (_deferred) libèrent leur place
+            # dans self._queue : la limite porte sur le total en attente
+            if 0 < self._queue.maxsize <= self.depth():
+                raise QueueFullError("Inference queue is full")
+            self._prune()
+            self._jobs[job.id] = job
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._jobs.pop(job.id, None)
+                raise QueueFullError("Inference queue is full")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job):
+        """Attend la fin d'un job sans bloquer l'event loop."""
+        return await asyncio.wrap_future(job.future)
+
+    def cancel(self, job):
+        """
+        Annule un job. En attente : retiré immédiatement. En cours : interrompu au
+        prochain step du pipeline (le worker est libéré). False si déjà terminé.
+        """
+        with self._lock:
+            if job.done:
+                return False
+            job._cancel.set()
+            queued = job.status == "queued"
+        if queued:
+            self._finish(job, error=JobCancelledError("Job cancelled"))
+        return True
+
+    def running(self):
+        """Jobs en cours d'exécution (appelé depuis le worker)."""
+        return list(self._running)
+
+    def depth(self):
+        return self._queue.qsize() + len(self._deferred)
+
+    def position(self, job):
+        """Position approximative du job dans la file (0 = en cours)."""
+        if job.status != "queued":
+            return 0
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j.status == "queued"]
+        queued.sort(key=lambda j: j.created_at)
+        return queued.index(job) + 1 if job in queued else 0
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        finish_times = list(self._finish_times)
+        throughput = 0.0
+        if len(finish_times) > 1 and finish_times[-1] > finish_times[0]:
+            throughput = (len(finish_times) - 1) / (finish_times[-1] - finish_times[0])
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "queue_depth": self.depth(),
+            "queue_max_size": self._queue.maxsize,
+            "running": self._current.id if self._current else None,
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "worker_alive": bool(self._worker and self._worker.is_alive()),
+            "batching": {
+                kind: {"max_batch_size": size, "max_wait": wait}
+                for kind, (_, size, wait) in self._batch_handlers.items()
+            },
+            # Nombre de batches exécutés par taille
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            # Latence soumission -> résultat (secondes) et débit (jobs/s)
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "throughput": throughput,
+        }
+
+    def _prune(self):
+        # Oublie les jobs terminés depuis plus de JOB_TTL_SECONDS
+        limit = time.time() - JOB_TTL_SECONDS
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at and job.finished_at < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _next_job(self, timeout=None):
+        if self._deferred:
+            return self._deferred.popleft()
+        job = self._queue.get(timeout=timeout)
+        self._queue.task_done()
+        return job
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job.cancel_requested:
+                # Annulé pendant l'attente : déjà terminé par cancel()
+                continue
+            if job.batch_key is not None and job.kind in self._batch_handlers:
+                self._execute_batch(self._collect_batch(job))
+            else:
+                self._execute(job)
+
+    def _collect_batch(self, first):
+        """Regroupe les jobs compatibles avec `first` pendant au plus max_wait secondes."""
+        _, max_batch_size, max_wait = self._batch_handlers[first.kind]
+        batch = [first]
+
+        def compatible(job):
+            return job.kind == first.kind and job.batch_key == first.batch_key
+
+        # D'abord les jobs déjà mis de côté
+        for job in list(self._deferred):
+            if len(batch) >= max_batch_size:
+                break
+            if compatible(job):
+                self._deferred.remove(job)
+                batch.append(job)
+
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if job.cancel_requested:
+                continue
+            if compatible(job):
+                batch.append(job)
+            else:
+                self._deferred.append(job)
+        return batch
+
+    def _start(self, job):
+        with self._lock:
+            if job.cancel_requested:
+                return False
+            job.status = "running"
+        self._current = job
+        job.started_at = time.time()
+        return True
+
+    def _finish(self, job, result=None, error=None):
+        if isinstance(result, Future):
+            # Résultat différé (ex. image en cours d'encodage) : le worker passe au job
+            # suivant, le job se termine quand le Future est résolu
+            result.add_done_callback(lambda future: self._finish_deferred(job, future))
+            return
+        job.finished_at = time.time()
+        if job.cancel_requested:
+            # Résultat éventuel ignoré (job annulé pendant un batch)
+            job.status = "cancelled"
+            self._cancelled += 1
+            job.future.set_exception(JobCancelledError("Job cancelled"))
+        elif error is None:
+            job.result = result
+            job.status = "done"
+            self._completed += 1
+            job.future.set_result(result)
+        else:
+            print(f"❌ Job {job.kind} {job.id} failed: {error}")
+            job.error = str(error)
+            job.status = "error"
+            self._failed += 1
+            job.future.set_exception(error)
+        self._latencies.append(job.finished_at - job.created_at)
+        self._finish_times.append(job.finished_at)
+
+    def _finish_deferred(self, job, future):
+        try:
+            self._finish(job, result=future.result())
+        except Exception as e:
+            self._finish(job, error=e)
+
+    def _execute(self, job):
+        if not self._start(job):
+            return
+        self._running = [job]
+        self._batch_sizes[1] = self._batch_sizes.get(1, 0) + 1
+        try:
+            with capture([job.profile], job.kind):
+                result = job.fn(*job.args, **job.kwargs)
+            self._finish(job, result=result)
+        except Exception as e:
+            self._finish(job, error=e)
+        finally:
+            self._current = None
+            self._running = []
+
+    def _execute_batch(self, batch):
+        if len(batch) == 1:
+            self._execute(batch[0])
+            return
+
+        handler = self._batch_handlers[batch[0].kind][0]
+        batch = [job for job in batch if self._start(job)]
+        if not batch:
+            return
+        for job in batch:
+            job.batch_size = len(batch)
+        self._current = batch[0]
+        self._running = batch
+        self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+
+        started = time.perf_counter()
+        try:
+            with capture([job.profile for job in batch], batch[0].kind, batch_size=len(batch)):
+                results = handler([job.args for job in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        elapsed = time.perf_counter() - started
+        print(f"📦 Batch of {len(batch)} {batch[0].kind} jobs in {elapsed:.2f}s ({elapsed / len(batch):.2f}s/job)")
+
+        for job, result in zip(batch, results):
+            if isinstance(result, Exception):
+                self._finish(job, error=result)
+            else:
+                self._finish(job, result=result)
+        self._current = None
+        self._running = []
+
+
+# Singleton instance
+job_queue = JobQueue()
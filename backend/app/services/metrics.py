@@ -0,0 +1,119 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration Métriques ---
+# Bornes des histogrammes (secondes) : de l'encodage d'une miniature à une génération CPU
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS_PREFIX = "lumina"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Métriques en mémoire, exposées au format texte Prometheus (GET /metrics) :
+    - histogrammes de durée par étape (upload, décodage, Canny, prompt, chargement
+      modèle, inférence, encodage, écriture, fsync) ;
+    - compteurs et durées des requêtes HTTP par route ;
+    - jauges calculées à la lecture (file, mémoire des modèles, caches), fournies par l'appelant.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}    # (stage, labels) -> _Histogram
+        self._requests = {}  # (method, route, status) -> nombre
+        self._durations = {}  # (method, route) -> _Histogram
+
+    # --- Mesure ---
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._stages.get(key)
+            if histogram is None:
+                histogram = self._stages[key] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def stage(self, stage, **labels):
+        """Chronomètre un bloc : `with metrics.stage("canny"): ...` (enregistré même en cas d'erreur)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+
+    def count_request(self, method, route, status, seconds):
+        with self._lock:
+            key = (method, route, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._durations.get((method, route))
+            if histogram is None:
+                histogram = self._durations[(method, route)] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    # --- Export ---
+    def _render_histogram(self, lines, name, labels, histogram):
+        cumulative = 0
+        for bound, count in zip(self.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    def render(self, gauges=()):
+        """
+        Texte Prometheus (format 0.0.4). `gauges` : [(nom, aide, type, [(labels dict, valeur)])]
+        ajoutées telles quelles (valeurs lues au moment de l'appel).
+        """
+        lines = []
+        with self._lock:
+            name = f"{METRICS_PREFIX}_stage_duration_seconds"
+            lines += [f"# HELP {name} Duration of processing stages.", f"# TYPE {name} histogram"]
+            for (stage, labels), histogram in sorted(self._stages.items()):
+                self._render_histogram(lines, name, (("stage", stage),) + labels, histogram)
+
+            name = f"{METRICS_PREFIX}_http_requests_total"
+            lines += [f"# HELP {name} HTTP requests by route and status.", f"# TYPE {name} counter"]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f"{name}{_labels((('method', method), ('route', route), ('status', status)))} {count}")
+
+            name = f"{METRICS_PREFIX}_http_request_duration_seconds"
+            lines += [f"# HELP {name} HTTP request duration by route.", f"# TYPE {name} histogram"]
+            for (method, route), histogram in sorted(self._durations.items()):
+                self._render_histogram(lines, name, (("method", method), ("route", route)), histogram)
+
+        for gauge_name, help_text, kind, samples in gauges:
+            name = f"{METRICS_PREFIX}_{gauge_name}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics = Metrics()
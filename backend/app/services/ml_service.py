@@ -1,26 +1,118 @@
-import torch
-from diffusers import StableDiffusionControlNetPipeline, ControlNetModel, UniPCMultistepScheduler
 import os
+import time
+from contextlib import contextmanager
+from .model_registry import model_registry
+from .adapter_registry import adapter_registry, MODE_STAGING, MODE_CLEANING, STYLE_LORAS
+from .prompt_cache import encode_prompts
+from .image_utils import tile_boxes, tile_weights
+from .metrics import metrics
 
 # --- Configuration ML ---
 # Utilisation de modèles optimisés pour la vitesse/mémoire si possible
 # "lllyasviel/sd-controlnet-canny" est le standard pour ControlNet Canny 1.5
 CONTROLNET_ID = "lllyasviel/sd-controlnet-canny"
 MODEL_ID = "runwayml/stable-diffusion-v1-5" 
+INPAINT_MODEL_ID = "runwayml/stable-diffusion-inpainting"
+
+# --- Micro-batching ---
+# Les requêtes /generate compatibles (steps, guidance, résolution) arrivées dans
+# une fenêtre de GENERATION_MAX_WAIT_MS sont regroupées en un seul appel pipeline.
+GENERATION_MAX_BATCH_SIZE = int(os.getenv("GENERATION_MAX_BATCH_SIZE", "4"))
+GENERATION_MAX_WAIT_MS = int(os.getenv("GENERATION_MAX_WAIT_MS", "50"))
+
+# --- Configuration Génération par tuiles (haute résolution) ---
+# La mémoire GPU dépend de la taille des tuiles, pas de celle de l'image (multiples de 8)
+GENERATION_TILE_SIZE = int(os.getenv("GENERATION_TILE_SIZE", "768")) // 8 * 8
+GENERATION_TILE_OVERLAP = int(os.getenv("GENERATION_TILE_OVERLAP", "128")) // 8 * 8
+# Prompt régional seulement sur les axes où la tuile couvre au plus cette fraction de l'image
+TILE_PROMPT_MAX_COVERAGE = 0.6
+
+# load_lora_weights modifie le text encoder en place : avec des LoRA de style, il ne doit
+# pas être partagé entre ControlNet et inpainting (le style fuirait dans les prompts d'inpainting)
+UNSHARED_COMPONENTS = ("text_encoder",) if STYLE_LORAS else ()
+
+# torch / diffusers sont importés à la demande (chargement des modèles) :
+# l'import des routers reste rapide au démarrage de l'API.
+
+def detect_device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+@contextmanager
+def _pinned_pipe(service):
+    """
+    Pipeline du service protégé de l'éviction le temps de l'inférence (même principe que
+    VisionService._pinned_model) : l'épinglage est pris d'abord, puis le pipeline est
+    vérifié et rechargé si besoin. IP-Adapter et LoRA s'activent ensuite, sous l'épinglage.
+    """
+    while True:
+        with model_registry.use(service.REGISTRY_NAME) as pinned:
+            pipe = service.pipe
+            if pinned and pipe is not None:
+                yield pipe
+                return
+        pipe = service.pipe
+        if pipe is not None:
+            # Chargé mais plus enregistré (éviction en cours) : ré-enregistré avant l'épinglage
+            service._register(pipe)
+        elif service.load_model() is None:
+            raise RuntimeError(f"Model {service.REGISTRY_NAME} unavailable")
+
+def tile_prompt(prompt, box, size):
+    """
+    Prompt régional d'une tuile : le prompt de la scène + la zone couverte, pour que
+    chaque tuile ne cherche pas à redessiner toute la pièce. Un axe n'est nommé que si
+    la tuile en couvre au plus TILE_PROMPT_MAX_COVERAGE (sinon la tuile voit presque
+    toute la scène sur cet axe) ; sans axe nommé, le prompt reste celui de la scène.
+    """
+    left, top, right, bottom = box
+    width, height = size
+
+    def zone(start, end, length, names):
+        if end - start > TILE_PROMPT_MAX_COVERAGE * length:
+            return None
+        return names[min(2, int(3 * (start + end) / 2 / length))]
+
+    vertical = zone(top, bottom, height, ("upper", "middle", "lower"))
+    horizontal = zone(left, right, width, ("left", "center", "right"))
+    if vertical is None and horizontal is None:
+        return prompt
+    area = " ".join(name for name in (vertical, horizontal) if name is not None)
+    return f"{prompt}, partial view of the {area} part of the room"
+
+def _step_callback_kwargs(callback):
+    """Arguments Diffusers du callback appelé à chaque step (aperçus, annulation)."""
+    if callback is None:
+        return {}
+    return {"callback_on_step_end": callback, "callback_on_step_end_tensor_inputs": ["latents"]}
 
 class MLService:
+    REGISTRY_NAME = "controlnet"
+
     def __init__(self):
         self.pipe = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"🚀 ML Service initialized on {self.device}")
+        self._device = None
+        # (prompt, LoRA actives) encodés au warm-up
+        self._warm_prompts = {}
+        print("🚀 ML Service initialized")
+
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = detect_device()
+        return self._device
 
     def load_model(self):
         """Charge le modèle Stable Diffusion + ControlNet en mémoire."""
         if self.pipe is not None:
             return self.pipe
 
-        print("⏳ Loading Stable Diffusion & ControlNet...")
+        print(f"⏳ Loading Stable Diffusion & ControlNet on {self.device}...")
+        started = time.perf_counter()
         try:
+            import torch
+            from diffusers import StableDiffusionControlNetPipeline, ControlNetModel, UniPCMultistepScheduler
+
             controlnet = ControlNetModel.from_pretrained(
                 CONTROLNET_ID, 
                 torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
@@ -46,15 +138,32 @@ class MLService:
                     print(f"⚠️ xformers not available: {e}")
             
             self.pipe.to(self.device)
+            self._register(self.pipe)
             self.log_gpu_info()
+            metrics.observe("model_load", time.perf_counter() - started, model=self.REGISTRY_NAME)
             print("✅ Model loaded successfully!")
             return self.pipe
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             return None
 
+    def _register(self, pipe):
+        # Partage des sous-modules identiques (text encoder, VAE, tokenizer) entre pipelines.
+        # Pas de partage avec le CPU offload CUDA : ses hooks sont propres à chaque pipeline.
+        replacements = model_registry.register(
+            self.REGISTRY_NAME, pipe.components, on_evict=self.unload, share=self.device == "cpu",
+            unshared=UNSHARED_COMPONENTS
+        )
+        for key, component in replacements.items():
+            setattr(pipe, key, component)
+
+    def unload(self):
+        """Appelé par le registre lors d'une éviction."""
+        self.pipe = None
+
     def log_gpu_info(self):
         """Affiche les informations sur le GPU."""
+        import torch
         if torch.cuda.is_available():
             print(f"🎮 GPU: {torch.cuda.get_device_name(0)}")
             print(f"💾 VRAM Total: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
@@ -62,42 +171,161 @@ class MLService:
         else:
             print("💻 Running on CPU")
 
-    def generate(self, prompt, image, negative_prompt="", steps=20, guidance_scale=7.5):
+    def register_warm_prompts(self, prompts, style_loras=()):
+        """Prompts fixes (presets de style, négatifs) à encoder dès le warm-up."""
+        self._warm_prompts.setdefault(tuple(style_loras), set()).update(prompts)
+
+    def warm_prompts(self):
+        """Pré-calcule les embeddings des prompts enregistrés. Retourne leur nombre."""
+        count = 0
+        with _pinned_pipe(self) as pipe:
+            for style_loras, prompts in self._warm_prompts.items():
+                adapter_registry.activate_loras(pipe, style_loras, name=self.REGISTRY_NAME)
+                encode_prompts(pipe, (MODEL_ID,) + style_loras, sorted(prompts), pipe._execution_device)
+                count += len(prompts)
+        return count
+
+    def generate(self, prompt, image, negative_prompt="", steps=20, guidance_scale=7.5, style_loras=()):
         """Génère une image à partir d'un prompt et d'une image de contrôle (Canny)."""
-        if self.pipe is None:
-            self.load_model()
-        
-        # Génération
-        output = self.pipe(
-            prompt,
-            image=image,
-            negative_prompt=negative_prompt,
-            num_inference_steps=steps,
-            guidance_scale=guidance_scale
+        return self.generate_batch(
+            [prompt], [image], [negative_prompt], steps=steps, guidance_scale=guidance_scale,
+            style_loras=style_loras
+        )[0]
+
+    def generate_batch(self, prompts, images, negative_prompts, steps=20, guidance_scale=7.5, style_loras=(), seed=None,
+                       callback=None, latents=None):
+        """
+        Génère plusieurs images en un seul appel pipeline.
+        Les images de contrôle doivent toutes avoir la même résolution.
+        `style_loras` : LoRA de style actives pour tout le batch (chargées une seule fois).
+        `seed` : bruit initial reproductible.
+        `callback` : callback_on_step_end Diffusers (progression, aperçus, annulation).
+        `latents` : bruit initial imposé (fenêtre d'un bruit commun, génération par tuiles).
+        """
+        with _pinned_pipe(self) as pipe:
+            return self._generate_batch(
+                pipe, prompts, images, negative_prompts, steps, guidance_scale, style_loras, seed, callback, latents
+            )
+
+    def _generate_batch(self, pipe, prompts, images, negative_prompts, steps, guidance_scale, style_loras, seed,
+                        callback, latents):
+        # Appelé sous _pinned_pipe : le pipeline ne peut pas être évincé pendant l'appel
+        import torch
+
+        adapter_registry.activate_loras(pipe, style_loras, name=self.REGISTRY_NAME)
+
+        # Text encoder CLIP : embeddings en cache (clé modèle + LoRA actives + prompt exact)
+        model_key = (MODEL_ID,) + tuple(style_loras)
+        device = pipe._execution_device
+        prompt_embeds = encode_prompts(pipe, model_key, prompts, device)
+        negative_prompt_embeds = encode_prompts(pipe, model_key, negative_prompts, device)
+        with metrics.stage("inference", model=self.REGISTRY_NAME):
+            output = pipe(
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=negative_prompt_embeds,
+                image=images,
+                num_inference_steps=steps,
+                guidance_scale=guidance_scale,
+                generator=torch.Generator("cpu").manual_seed(seed) if seed is not None else None,
+                latents=latents.to(device, dtype=pipe.unet.dtype) if latents is not None else None,
+                **_step_callback_kwargs(callback)
+            )
+        return output.images
+
+    def generate_tiled(self, prompt, image, negative_prompt="", steps=20, guidance_scale=7.5, style_loras=(),
+                       tile_size=GENERATION_TILE_SIZE, overlap=GENERATION_TILE_OVERLAP, callback=None):
+        """
+        Génération haute résolution : l'image de contrôle (pleine résolution) est découpée
+        en tuiles chevauchantes régulièrement espacées, générées une par une, puis fondues
+        linéairement sur leur chevauchement réel (les poids de deux voisines se complètent).
+        - Cohérence entre tuiles : un seul bruit latent pour toute l'image, chaque tuile part
+          de sa fenêtre (même bruit sur les zones partagées), avec un prompt régional.
+        - Mémoire : le pic GPU est celui d'une tuile ; côté hôte, seule la bande de tuiles en
+          cours est en float32, le résultat est écrit directement en uint8 bande par bande.
+        """
+        import numpy as np
+        import torch
+        from PIL import Image
+
+        if overlap >= tile_size:
+            raise ValueError("Tile overlap must be smaller than tile size")
+        # Le pipeline travaille sur des dimensions multiples de 8 (1 pixel latent = 8 pixels)
+        width, height = image.width // 8 * 8, image.height // 8 * 8
+        image = image.crop((0, 0, width, height))
+        seed = int(torch.randint(0, 2 ** 31 - 1, (1,)).item())
+        noise = torch.randn(
+            (1, 4, height // 8, width // 8), generator=torch.Generator("cpu").manual_seed(seed), dtype=torch.float32
         )
-        
-        return output.images[0]
+
+        boxes = tile_boxes((width, height), tile_size, overlap)
+        bands = sorted({(top, bottom) for _, top, _, bottom in boxes})
+        print(f"🧩 Tiled generation {width}x{height}: {len(boxes)} tiles of {tile_size}px (overlap {overlap}px)")
+
+        # Un seul épinglage pour toutes les tuiles : pas d'éviction ni de rechargement entre deux tuiles
+        with _pinned_pipe(self) as pipe:
+            output = np.empty((height, width, 3), dtype=np.uint8)
+            # Lignes de la bande précédente encore recouvertes par la suivante : (haut, somme pondérée, poids)
+            carry = None
+            for index, (top, bottom) in enumerate(bands):
+                canvas = np.zeros((bottom - top, width, 3), dtype=np.float32)
+                weights = np.zeros((bottom - top, width, 1), dtype=np.float32)
+                if carry is not None:
+                    carry_top, carry_canvas, carry_weights = carry
+                    rows = slice(carry_top - top, carry_top - top + carry_canvas.shape[0])
+                    canvas[rows] += carry_canvas
+                    weights[rows] += carry_weights
+
+                for left, _, right, _ in (box for box in boxes if (box[1], box[3]) == (top, bottom)):
+                    box = (left, top, right, bottom)
+                    tile = self._generate_batch(
+                        pipe, [tile_prompt(prompt, box, (width, height))], [image.crop(box)], [negative_prompt],
+                        steps, guidance_scale, style_loras, None, callback,
+                        noise[:, :, top // 8:bottom // 8, left // 8:right // 8]
+                    )[0]
+                    weight = tile_weights(box, boxes)
+                    canvas[:, left:right] += np.asarray(tile, dtype=np.float32) * weight
+                    weights[:, left:right] += weight
+
+                # Lignes définitives (non recouvertes par la bande suivante) : écrites en uint8
+                next_top = bands[index + 1][0] if index + 1 < len(bands) else bottom
+                final = next_top - top
+                blended = canvas[:final] / np.maximum(weights[:final], 1e-6)
+                output[top:next_top] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+                carry = (next_top, canvas[final:], weights[final:]) if final < bottom - top else None
+
+        return Image.fromarray(output)
 
 # Singleton instance
 ml_service = MLService()
 
 # --- Inpainting Pipeline ---
-from diffusers import StableDiffusionInpaintPipeline
-
 class InpaintingService:
+    REGISTRY_NAME = "inpainting"
+
     def __init__(self):
         self.pipe = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"🎨 Inpainting Service initialized on {self.device}")
+        self._device = None
+        self._warm_prompts = set()
+        print("🎨 Inpainting Service initialized")
+
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = detect_device()
+        return self._device
 
     def load_model(self):
         if self.pipe is not None:
             return self.pipe
         
-        print("⏳ Loading Inpainting Model...")
+        print(f"⏳ Loading Inpainting Model on {self.device}...")
+        started = time.perf_counter()
         try:
+            import torch
+            from diffusers import StableDiffusionInpaintPipeline, UniPCMultistepScheduler
+
             self.pipe = StableDiffusionInpaintPipeline.from_pretrained(
-                "runwayml/stable-diffusion-inpainting",
+                INPAINT_MODEL_ID,
                 torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
                 safety_checker=None
             )
@@ -112,61 +340,116 @@ class InpaintingService:
                     pass
             
             self.pipe.to(self.device)
+            self._register(self.pipe)
+            metrics.observe("model_load", time.perf_counter() - started, model=self.REGISTRY_NAME)
             print("✅ Inpainting Model loaded!")
             return self.pipe
         except Exception as e:
             print(f"❌ Error loading inpainting model: {e}")
             return None
 
-    def load_ip_adapter(self):
-        """Charge IP-Adapter pour le Virtual Staging."""
-        print("🔌 Loading IP-Adapter...")
+    def _register(self, pipe):
+        replacements = model_registry.register(
+            self.REGISTRY_NAME, pipe.components, on_evict=self.unload, share=self.device == "cpu",
+            unshared=UNSHARED_COMPONENTS
+        )
+        for key, component in replacements.items():
+            setattr(pipe, key, component)
+
+    def unload(self):
+        """Appelé par le registre lors d'une éviction."""
+        self.pipe = None
+
+    def _prompt_model_key(self, pipe):
+        # Clé du cache de prompts : modèle + LoRA actives sur le text encoder effectivement utilisé
+        return (INPAINT_MODEL_ID,) + adapter_registry.active_loras_for(pipe.text_encoder)
+
+    def register_warm_prompts(self, prompts):
+        """Prompts fixes (nettoyage, négatifs du staging) à encoder dès le warm-up."""
+        self._warm_prompts.update(prompts)
+
+    def warm_prompts(self):
+        """Pré-calcule les embeddings des prompts enregistrés. Retourne leur nombre."""
+        prompts = sorted(self._warm_prompts)
+        with _pinned_pipe(self) as pipe:
+            if prompts:
+                encode_prompts(pipe, self._prompt_model_key(pipe), prompts, pipe._execution_device)
+        return len(prompts)
+
+    def load_ip_adapter(self, pipe):
+        """
+        Charge IP-Adapter pour le Virtual Staging (une seule fois par pipeline).
+        Appelé sous _pinned_pipe : le ré-enregistrement garde l'épinglage en cours.
+        """
         try:
-            # On charge l'IP-Adapter standard pour SD1.5
-            self.pipe.load_ip_adapter("h94/IP-Adapter", subfolder="models", weight_name="ip-adapter_sd15.bin")
-            self.pipe.set_ip_adapter_scale(0.9) # Augmenté à 0.9 pour une meilleure fidélité produit
-            
-            # FIX: S'assurer que l'image_encoder est sur le bon device/dtype
-            if self.device == "cuda":
-                self.pipe.image_encoder.to(self.device, dtype=torch.float16)
-            
-            print("✅ IP-Adapter loaded!")
+            if adapter_registry.ensure_ip_adapter(pipe, self.device, name=self.REGISTRY_NAME):
+                # L'image_encoder fait désormais partie du pipeline résident
+                self._register(pipe)
         except Exception as e:
             print(f"❌ Error loading IP-Adapter: {e}")
 
-    def inpaint(self, prompt, image, mask_image, ip_adapter_image=None, negative_prompt="", steps=20, guidance_scale=7.5):
-        if self.pipe is None:
-            self.load_model()
-        
-        # Si une image produit est fournie, on active IP-Adapter
-        if ip_adapter_image:
-            try:
-                self.load_ip_adapter()
-                self.pipe.set_ip_adapter_scale(0.9) # Activer
-                # IP-Adapter attend 'ip_adapter_image' dans l'appel
-                kwargs = {"ip_adapter_image": ip_adapter_image}
-            except Exception as e:
-                print(f"⚠️ Could not use IP-Adapter: {e}")
-                kwargs = {}
-        else:
-            # Désactiver IP-Adapter pour le mode Gomme/Nettoyage
-            # Si l'adapter a été chargé précédemment, on le met à 0
-            try:
-                if hasattr(self.pipe, "set_ip_adapter_scale"):
-                    self.pipe.set_ip_adapter_scale(0.0)
-            except Exception as e:
-                print(f"⚠️ Could not disable IP-Adapter: {e}")
+    def encode_ip_adapter_image(self, ip_adapter_image):
+        """
+        Calcule les embeddings IP-Adapter (encodeur d'image CLIP) d'une image produit.
+        Retourne une liste de tenseurs CPU [négatif, positif] (classifier-free guidance),
+        réutilisable via inpaint(ip_adapter_image_embeds=...).
+        """
+        import torch
+
+        with _pinned_pipe(self) as pipe, torch.no_grad():
+            self.load_ip_adapter(pipe)
+            embeds = pipe.prepare_ip_adapter_image_embeds(
+                ip_adapter_image=ip_adapter_image,
+                ip_adapter_image_embeds=None,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=True
+            )
+        return [e.detach().to("cpu", dtype=torch.float32) for e in embeds]
+
+    def inpaint(self, prompt, image, mask_image, ip_adapter_image=None, negative_prompt="", steps=20, guidance_scale=7.5,
+                ip_adapter_image_embeds=None, width=None, height=None, callback=None):
+        with _pinned_pipe(self) as pipe:
             kwargs = {}
+            if ip_adapter_image_embeds is not None or ip_adapter_image:
+                # MODE STAGING : IP-Adapter chargé une fois, puis simplement réactivé
+                self.load_ip_adapter(pipe)
+                if adapter_registry.has_ip_adapter(pipe):
+                    adapter_registry.set_mode(pipe, MODE_STAGING)
+                    if ip_adapter_image_embeds is not None:
+                        # Embeddings précalculés (produit du catalogue) : pas d'encodeur d'image à l'appel
+                        kwargs = {"ip_adapter_image_embeds": [
+                            e.to(self.device, dtype=pipe.unet.dtype) for e in ip_adapter_image_embeds
+                        ]}
+                    else:
+                        # IP-Adapter attend 'ip_adapter_image' dans l'appel
+                        kwargs = {"ip_adapter_image": ip_adapter_image}
+                else:
+                    print("⚠️ Could not use IP-Adapter")
+            elif adapter_registry.has_ip_adapter(pipe):
+                # MODE GOMME/NETTOYAGE : l'adapter reste chargé, échelle 0 et embeddings nuls
+                adapter_registry.set_mode(pipe, MODE_CLEANING)
+                kwargs = {"ip_adapter_image_embeds": adapter_registry.neutral_ip_embeds(
+                    pipe, self.device, pipe.unet.dtype
+                )}
 
-        output = self.pipe(
-            prompt=prompt,
-            image=image,
-            mask_image=mask_image,
-            negative_prompt=negative_prompt,
-            num_inference_steps=steps,
-            guidance_scale=guidance_scale,
-            **kwargs
-        )
+            device = pipe._execution_device
+            model_key = self._prompt_model_key(pipe)
+            prompt_embeds = encode_prompts(pipe, model_key, [prompt], device)
+            negative_prompt_embeds = encode_prompts(pipe, model_key, [negative_prompt], device)
+            with metrics.stage("inference", model=self.REGISTRY_NAME):
+                output = pipe(
+                    prompt_embeds=prompt_embeds,
+                    negative_prompt_embeds=negative_prompt_embeds,
+                    image=image,
+                    mask_image=mask_image,
+                    width=width,
+                    height=height,
+                    num_inference_steps=steps,
+                    guidance_scale=guidance_scale,
+                    **kwargs,
+                    **_step_callback_kwargs(callback)
+                )
         return output.images[0]
 
 inpainting_service = InpaintingService()
@@ -0,0 +1,240 @@
+import gc
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Configuration Mémoire ---
+# Budget RAM des modèles résidents (Go). 0 = pas de limite.
+MODEL_RAM_BUDGET_GB = float(os.getenv("MODEL_RAM_BUDGET_GB", "0"))
+# Nombre max de valeurs échantillonnées par tenseur pour l'empreinte des poids
+FINGERPRINT_SAMPLES = 4096
+
+
+def module_bytes(module):
+    """Mémoire occupée par les paramètres et buffers d'un module torch (octets)."""
+    seen = set()
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def fingerprint(component):
+    """
+    Empreinte des poids d'un composant : classe, dtype/forme de chaque tenseur et
+    échantillon de ses valeurs. Deux composants de même empreinte ont les mêmes poids.
+    Les tokenizers sont comparés via leur vocabulaire. None si non comparable.
+    """
+    import torch
+
+    hasher = hashlib.sha1(type(component).__name__.encode())
+    if isinstance(component, torch.nn.Module):
+        with torch.no_grad():
+            for key, tensor in component.state_dict().items():
+                hasher.update(f"{key}:{tuple(tensor.shape)}:{tensor.dtype}:{tensor.device.type}".encode())
+                flat = tensor.detach().reshape(-1)
+                step = max(1, flat.numel() // FINGERPRINT_SAMPLES)
+                hasher.update(flat[::step].to("cpu", dtype=torch.float32).numpy().tobytes())
+        return hasher.hexdigest()
+    if hasattr(component, "get_vocab"):
+        vocab = component.get_vocab()
+        hasher.update(repr(sorted(vocab.items())).encode())
+        return hasher.hexdigest()
+    return None
+
+
+class _Entry:
+    def __init__(self, name, components, on_evict):
+        self.name = name
+        self.components = components
+        self.on_evict = on_evict
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.in_use = 0
+
+
+class ModelRegistry:
+    """
+    Registre central des modèles résidents (pipelines Diffusers, YOLO).
+    - Partage les sous-modules identiques (text encoder, VAE, tokenizer...) entre pipelines.
+    - Suit la mémoire de chaque modèle et évince le moins récemment utilisé
+      quand le budget MODEL_RAM_BUDGET_GB est dépassé.
+    """
+
+    def __init__(self, budget_bytes=int(MODEL_RAM_BUDGET_GB * 1024 ** 3)):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        # empreinte -> [composant, noms des modèles qui l'utilisent]
+        self._shared = {}
+        self.evictions = 0
+
+    def register(self, name, components, on_evict=None, share=False, unshared=()):
+        """
+        Enregistre un modèle chargé. `components` : {nom: objet} (ex. pipe.components).
+        Si share=True, retourne {nom: composant déjà résident} pour les composants
+        dont les poids sont identiques : l'appelant remplace les siens par ceux-ci.
+        `unshared` : composants jamais partagés (ex. modifiés en place par des LoRA).
+        """
+        replacements = {}
+        with self._lock:
+            entry = self._drop(name)
+            kept = {}
+            for key, component in components.items():
+                if component is None:
+                    continue
+                digest = fingerprint(component) if share and key not in unshared else None
+                if digest is not None and digest in self._shared:
+                    shared, users = self._shared[digest]
+                    if shared is not component:
+                        replacements[key] = shared
+                        component = shared
+                    users.add(name)
+                elif digest is not None:
+                    self._shared[digest] = [component, {name}]
+                kept[key] = (component, digest)
+            if entry is None:
+                entry = _Entry(name, kept, on_evict)
+            else:
+                # Ré-enregistrement (ex. IP-Adapter ajouté) : l'entrée garde les use() en cours
+                entry.components, entry.on_evict = kept, on_evict
+            self._entries[name] = entry
+
+        if replacements:
+            print(f"♻️ {name}: sharing {', '.join(sorted(replacements))} with resident models")
+        self._enforce_budget(keep=name)
+        return replacements
+
+    def touch(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.last_used = time.time()
+                self._entries.move_to_end(name)
+
+    @contextmanager
+    def use(self, name):
+        """
+        Marque un modèle comme utilisé (non évinçable) pendant une inférence.
+        Produit True si le modèle est épinglé, False s'il n'est pas (ou plus) enregistré :
+        l'appelant doit alors le (re)charger avant de s'en servir.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.in_use += 1
+        if entry is None:
+            print(f"⚠️ Model {name} is not registered, cannot pin it")
+        self.touch(name)
+        try:
+            yield entry is not None
+        finally:
+            with self._lock:
+                if entry is not None:
+                    entry.in_use -= 1
+
+    def evict(self, name):
+        """Décharge un modèle (callback on_evict du service) et libère la mémoire."""
+        with self._lock:
+            entry = self._drop(name)
+        if entry is None:
+            return
+        self.evictions += 1
+        print(f"🗑️ Evicting model {name}")
+        if entry.on_evict:
+            entry.on_evict()
+        entry.components.clear()
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def resident_bytes(self):
+        """Mémoire totale des modèles résidents, composants partagés comptés une seule fois."""
+        with self._lock:
+            if not self._entries:
+                return 0
+            return sum(module_bytes(m) for m in self._unique_modules(self._entries.values()))
+
+    def report(self):
+        with self._lock:
+            models = []
+            for entry in self._entries.values():
+                shared = sorted(
+                    key for key, (_, digest) in entry.components.items()
+                    if digest is not None and len(self._shared[digest][1]) > 1
+                )
+                models.append({
+                    "name": entry.name,
+                    "bytes": sum(module_bytes(m) for m in self._unique_modules([entry])),
+                    "components": sorted(entry.components),
+                    "shared_components": shared,
+                    "loaded_at": entry.loaded_at,
+                    "last_used": entry.last_used,
+                    "in_use": entry.in_use > 0,
+                })
+            return {
+                "models": models,
+                "resident_bytes": self.resident_bytes(),
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+            }
+
+    # --- Interne ---
+    def _drop(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return None
+        for _, digest in entry.components.values():
+            if digest is None or digest not in self._shared:
+                continue
+            users = self._shared[digest][1]
+            users.discard(name)
+            if not users:
+                del self._shared[digest]
+        return entry
+
+    @staticmethod
+    def _unique_modules(entries):
+        # Aucun modèle chargé = torch pas encore importé : ne pas l'importer pour un rapport
+        if not entries:
+            return []
+        try:
+            import torch
+        except ImportError:
+            return []
+
+        seen = {}
+        for entry in entries:
+            for component, _ in entry.components.values():
+                if isinstance(component, torch.nn.Module):
+                    seen[id(component)] = component
+        return list(seen.values())
+
+    def _enforce_budget(self, keep):
+        if self.budget_bytes <= 0:
+            return
+        while self.resident_bytes() > self.budget_bytes:
+            with self._lock:
+                # Le moins récemment utilisé d'abord, sauf le modèle demandé et ceux en cours d'utilisation
+                candidates = [
+                    name for name, entry in self._entries.items()
+                    if name != keep and entry.in_use == 0
+                ]
+            if not candidates:
+                print("⚠️ Model memory budget exceeded, nothing evictable")
+                return
+            self.evict(candidates[0])
+
+
+# Singleton instance
+model_registry = ModelRegistry()
@@ -0,0 +1,99 @@
+import io
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from PIL import Image
+from ..database import SessionLocal
+from ..models import Product
+from .image_fetcher import image_fetcher
+
+# --- Configuration Embeddings produits ---
+EMBEDDINGS_DIR = "data/embeddings"
+# Nombre d'embeddings gardés en mémoire (LRU)
+EMBEDDINGS_CACHE_SIZE = int(os.getenv("EMBEDDINGS_CACHE_SIZE", "64"))
+
+
+def local_product_path(image_url):
+    """http://localhost:8000/static/products/xyz.png -> static/products/xyz.png (None si URL externe)."""
+    if ("localhost" in image_url or "127.0.0.1" in image_url) and "/static/" in image_url:
+        return os.path.join("static", image_url.split("/static/")[1])
+    return None
+
+
+def load_product_image(image_url):
+    """Charge l'image d'un produit (disque local ou téléchargement), prête pour IP-Adapter."""
+    local_path = local_product_path(image_url)
+    if local_path:
+        image = Image.open(local_path).convert("RGB")
+    else:
+        image = Image.open(io.BytesIO(image_fetcher.fetch_sync(image_url))).convert("RGB")
+    image.thumbnail((512, 512), Image.LANCZOS)
+    return image
+
+
+class ProductEmbeddingStore:
+    """
+    Embeddings IP-Adapter des produits du catalogue.
+    Calculés une fois à l'ajout du produit (ou par backfill), stockés sur disque
+    et référencés par Product.ip_adapter_embeds ; le staging les relit au lieu
+    de recharger l'image et de relancer l'encodeur CLIP.
+    """
+
+    def __init__(self, directory=EMBEDDINGS_DIR, cache_size=EMBEDDINGS_CACHE_SIZE):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compute(self, product_id, image_url):
+        """Calcule, persiste et référence les embeddings d'un produit (worker d'inférence)."""
+        import torch
+        from .ml_service import inpainting_service
+
+        print(f"🧬 Computing IP-Adapter embeddings for product {product_id}")
+        embeds = inpainting_service.encode_ip_adapter_image(load_product_image(image_url))
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{product_id}.pt")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        torch.save(embeds, tmp_path)
+        os.replace(tmp_path, path)
+
+        db = SessionLocal()
+        try:
+            db.query(Product).filter(Product.id == product_id).update({Product.ip_adapter_embeds: path})
+            db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._cache.pop(path, None)
+        print(f"✅ Embeddings saved: {path}")
+        return path
+
+    def load(self, path):
+        """Charge des embeddings depuis le disque (avec cache LRU en mémoire)."""
+        with self._lock:
+            embeds = self._cache.get(path)
+            if embeds is not None:
+                self._cache.move_to_end(path)
+                return embeds
+
+        import torch
+        embeds = torch.load(path, map_location="cpu")
+        with self._lock:
+            self._cache[path] = embeds
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return embeds
+
+    def delete(self, path):
+        with self._lock:
+            self._cache.pop(path, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+# Singleton instance
+product_embeddings = ProductEmbeddingStore()
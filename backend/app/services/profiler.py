@@ -0,0 +1,207 @@
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Configuration Profilage ---
+# Profilage à la demande : en-tête admin (X-Lumina-Profile: 1 + token admin) ou échantillonnage.
+# 0 = jamais échantillonné (seul l'en-tête déclenche le profilage)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = "x-lumina-profile"
+# Trace torch.profiler (opérateurs CPU / CUDA) en plus de cProfile
+PROFILE_TORCH = os.getenv("PROFILE_TORCH", "0") == "1"
+# Profils conservés (les plus anciens et leurs fichiers sont supprimés)
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "20"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "cache/profiles")
+# Lignes du résumé texte (tri par temps cumulé)
+PROFILE_TOP_FUNCTIONS = 40
+
+# Profil de la requête en cours : lu par job_queue.submit (suivi du job jusqu'au worker) et par profiled()
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Profil d'une requête : durée HTTP, puis captures cProfile (et torch) de ses jobs
+    d'inférence et de ses appels profilés hors job (détection, base de données).
+    """
+
+    def __init__(self, method, path, reason):
+        self.id = str(uuid.uuid4())
+        self.method = method
+        self.path = path
+        self.reason = reason  # "header" ou "sampled"
+        self.created_at = time.time()
+        self.status_code = None
+        self.request_seconds = None
+        # Une entrée par bloc capturé (job, détection, base) : {"kind", "batch_size", "seconds", "report", ...}
+        self.captures = []
+
+    def to_dict(self, detail=False):
+        data = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "created_at": self.created_at,
+            "status_code": self.status_code,
+            "request_seconds": self.request_seconds,
+            "captures": len(self.captures),
+        }
+        if detail:
+            data["captures"] = self.captures
+        return data
+
+
+class ProfileStore:
+    """Profils récents, en mémoire (résumés) et sur disque (.prof pstats, traces torch)."""
+
+    def __init__(self, max_stored=PROFILE_MAX_STORED, directory=PROFILE_DIR):
+        self.max_stored = max_stored
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._profiles = OrderedDict()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_stored:
+                _, evicted = self._profiles.popitem(last=False)
+                for path in self.files(evicted).values():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [profile.to_dict() for profile in reversed(self._profiles.values())]
+
+    def path(self, profile, index, extension):
+        return os.path.join(self.directory, f"{profile.id}-{index}.{extension}")
+
+    def files(self, profile):
+        """Fichiers existants du profil : {"<index>.pstats" | "<index>.trace": chemin}."""
+        files = {}
+        for index in range(len(profile.captures)):
+            for extension, label in (("prof", "pstats"), ("trace.json", "trace")):
+                path = self.path(profile, index, extension)
+                if os.path.exists(path):
+                    files[f"{index}.{label}"] = path
+        return files
+
+
+# Singleton instance
+profile_store = ProfileStore()
+
+# cProfile (sys.monitoring depuis Python 3.12) n'accepte qu'un profileur actif à la fois
+_capture_lock = threading.Lock()
+
+
+def start_request_profile(method, path, admin_requested):
+    """
+    Profil à ouvrir pour cette requête, ou None (cas courant : aucune allocation).
+    admin_requested : en-tête de profilage présent avec un token admin valide.
+    """
+    if admin_requested:
+        reason = "header"
+    elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return None
+    profile = RequestProfile(method, path, reason)
+    profile_store.add(profile)
+    return profile
+
+
+def profiled(kind, fn):
+    """
+    `fn` profilée pour la requête en cours, hors job d'inférence (threadpool, accès base).
+    Le profil est lu ici, dans le contexte de la requête ; sans profil, `fn` est retournée telle quelle.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return fn
+
+    def call(*args, **kwargs):
+        with capture([profile], kind):
+            return fn(*args, **kwargs)
+    return call
+
+
+def _torch_profiler():
+    # Seulement si torch est déjà chargé (le profilage ne doit pas déclencher l'import)
+    torch = sys.modules.get("torch")
+    if not PROFILE_TORCH or torch is None:
+        return None
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(activities=activities)
+
+
+@contextmanager
+def capture(profiles, kind, batch_size=1):
+    """
+    Profile un bloc (job du worker d'inférence, appel en threadpool, accès base) pour chaque
+    profil de `profiles` (jobs profilés d'un batch : une seule capture, partagée). Sans profil,
+    ne fait rien.
+    """
+    profiles = [profile for profile in profiles if profile is not None]
+    if not profiles:
+        yield
+        return
+    if not _capture_lock.acquire(blocking=False):
+        for profile in profiles:
+            profile.captures.append({"kind": kind, "batch_size": batch_size, "error": "another capture is running"})
+        yield
+        return
+
+    try:
+        profiler = cProfile.Profile()
+        torch_profiler = _torch_profiler()
+        started = time.perf_counter()
+        if torch_profiler is not None:
+            torch_profiler.__enter__()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if torch_profiler is not None:
+                torch_profiler.__exit__(None, None, None)
+            seconds = time.perf_counter() - started
+            _store_capture(profiles, kind, batch_size, seconds, profiler, torch_profiler)
+    finally:
+        _capture_lock.release()
+
+
+def _store_capture(profiles, kind, batch_size, seconds, profiler, torch_profiler):
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    os.makedirs(profile_store.directory, exist_ok=True)
+
+    for profile in profiles:
+        index = len(profile.captures)
+        entry = {"kind": kind, "batch_size": batch_size, "seconds": seconds, "report": text.getvalue()}
+        try:
+            profiler.dump_stats(profile_store.path(profile, index, "prof"))
+            if torch_profiler is not None:
+                torch_profiler.export_chrome_trace(profile_store.path(profile, index, "trace.json"))
+                entry["torch_ops"] = torch_profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=25)
+        except Exception as e:
+            entry["error"] = str(e)
+        profile.captures.append(entry)
+    print(f"🔬 Profiled {kind} ({batch_size} job(s), {seconds:.2f}s): {', '.join(p.id for p in profiles)}")
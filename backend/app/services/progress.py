@@ -0,0 +1,56 @@
+import base64
+import io
+import os
+from .job_queue import JobCancelledError
+
+# --- Configuration Aperçus progressifs ---
+# Un aperçu tous les N steps (la progression est publiée à chaque step)
+PREVIEW_EVERY_STEPS = int(os.getenv("PREVIEW_EVERY_STEPS", "2"))
+# Plus grand côté de l'aperçu (px)
+PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", "256"))
+PREVIEW_QUALITY = 70
+
+# Projection linéaire approximative des 4 canaux latents SD 1.5 vers RGB :
+# quelques multiplications au lieu d'un décodage VAE complet.
+LATENT_RGB_FACTORS = [
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473],
+]
+
+
+def latents_to_preview(latents, size=PREVIEW_SIZE):
+    """Aperçu JPEG basse résolution (data URL) d'un latent (4, h/8, w/8)."""
+    import torch
+    from PIL import Image
+
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32)
+    rgb = torch.einsum("chw,cr->hwr", latents.detach().to("cpu", dtype=torch.float32), factors)
+    rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).to(torch.uint8).numpy()
+
+    image = Image.fromarray(rgb)
+    scale = size / max(image.size)
+    image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=PREVIEW_QUALITY)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def step_callback(jobs, total_steps, every=PREVIEW_EVERY_STEPS):
+    """
+    Callback `callback_on_step_end` des pipelines Diffusers pour les `jobs` en cours
+    (un latent par job, dans l'ordre du batch) : publie l'avancement, un aperçu tous
+    les `every` steps, et interrompt le pipeline si tous les jobs ont été annulés.
+    """
+    def on_step_end(pipe, step, timestep, callback_kwargs):
+        if jobs and all(job.cancel_requested for job in jobs):
+            raise JobCancelledError("Job cancelled")
+        latents = callback_kwargs.get("latents")
+        with_preview = latents is not None and every > 0 and ((step + 1) % every == 0 or step + 1 == total_steps)
+        for i, job in enumerate(jobs):
+            preview = latents_to_preview(latents[i]) if with_preview and i < latents.shape[0] else None
+            job.report_progress(step + 1, total_steps, preview)
+        return callback_kwargs
+
+    return on_step_end
@@ -0,0 +1,44 @@
+import os
+from .cache import TieredCache, content_key
+from .metrics import metrics
+
+# --- Configuration Cache Prompts ---
+# Sorties du text encoder CLIP (77 x 768 par prompt, ~230 Ko en float32)
+PROMPT_CACHE_MEMORY_MB = int(os.getenv("PROMPT_CACHE_MEMORY_MB", "64"))
+
+prompt_cache = TieredCache(
+    "prompt_embeds",
+    max_memory_bytes=PROMPT_CACHE_MEMORY_MB * 1024 * 1024,
+    size_of=lambda tensor: tensor.numel() * tensor.element_size(),
+)
+
+
+def encode_prompts(pipe, model_key, prompts, device):
+    """
+    Embeddings texte (batch, 77, dim) des `prompts`, prêts pour prompt_embeds /
+    negative_prompt_embeds. Chaque prompt n'est encodé qu'une fois par `model_key`
+    (modèle + LoRA actives, qui peuvent modifier le text encoder).
+    """
+    import torch
+
+    keys = {prompt: content_key(prompt.encode("utf-8"), *model_key) for prompt in prompts}
+    embeds = {}
+    missing = []
+    for prompt, key in keys.items():
+        cached = prompt_cache.get(key)
+        if cached is None:
+            missing.append(prompt)
+        else:
+            embeds[prompt] = cached
+
+    if missing:
+        with metrics.stage("prompt_encode"), torch.no_grad():
+            encoded, _ = pipe.encode_prompt(
+                missing, device=device, num_images_per_prompt=1, do_classifier_free_guidance=False
+            )
+        for prompt, tensor in zip(missing, encoded):
+            # Copie CPU : le cache survit au déchargement / offload du pipeline
+            embeds[prompt] = tensor.detach().to("cpu")
+            prompt_cache.put(keys[prompt], embeds[prompt])
+
+    return torch.stack([embeds[prompt] for prompt in prompts]).to(device)
@@ -0,0 +1,142 @@
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import metrics
+
+# --- Configuration Ecriture des Résultats ---
+# Format des images générées : "png" (sans perte), "webp" ou "jpeg"
+RESULT_FORMAT = os.getenv("RESULT_FORMAT", "png").lower()
+# zlib 0-9 : 1 encode plusieurs fois plus vite que 6 (défaut PIL) pour ~10-15 % de taille en plus
+RESULT_PNG_COMPRESS_LEVEL = int(os.getenv("RESULT_PNG_COMPRESS_LEVEL", "1"))
+# Qualité WebP / JPEG (0-100) et effort WebP (0 rapide - 6 compact)
+RESULT_QUALITY = int(os.getenv("RESULT_QUALITY", "90"))
+RESULT_WEBP_METHOD = int(os.getenv("RESULT_WEBP_METHOD", "4"))
+RESULT_WRITER_WORKERS = int(os.getenv("RESULT_WRITER_WORKERS", "2"))
+# Durabilité des fichiers écrits :
+#   "1"        : fsync du fichier avant renommage (jamais de fichier tronqué après une coupure),
+#                puis du répertoire en arrière-plan ; la réponse attend le fsync du fichier
+#   "deferred" : renommage d'abord, la réponse part dès que les octets sont en place ; fsync du
+#                fichier et du répertoire ensuite (une coupure dans cette fenêtre peut laisser
+#                un fichier vide ou tronqué)
+#   "0"        : aucun fsync
+RESULT_FSYNC = os.getenv("RESULT_FSYNC", "1").lower()
+FSYNC_MODES = ("1", "deferred", "0")
+
+_FORMATS = {
+    "png": ("PNG", "png"),
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+}
+
+
+def save_options(pil_format):
+    if pil_format == "PNG":
+        return {"compress_level": RESULT_PNG_COMPRESS_LEVEL}
+    if pil_format == "WEBP":
+        return {"quality": RESULT_QUALITY, "method": RESULT_WEBP_METHOD}
+    return {"quality": RESULT_QUALITY}
+
+
+class ResultWriter:
+    """
+    Encode et écrit les images générées hors du worker d'inférence (pool de threads :
+    les encodeurs PIL libèrent le GIL), qui enchaîne directement sur le job suivant.
+
+    L'écriture est atomique (fichier temporaire, puis os.replace) : une URL retournée
+    pointe toujours vers une image complète. Durabilité selon `fsync` (RESULT_FSYNC) :
+    - "1" : fichier synchronisé avant le renommage, complet même après une coupure ;
+      seul le fsync du répertoire est différé, sur le même pool ;
+    - "deferred" : publié dès que les octets sont écrits, fichier et répertoire
+      synchronisés ensuite sur le pool (la réponse n'attend aucun fsync) ;
+    - "0" : aucun fsync.
+    """
+
+    def __init__(self, image_format=RESULT_FORMAT, max_workers=RESULT_WRITER_WORKERS, fsync=RESULT_FSYNC):
+        if image_format not in _FORMATS:
+            raise ValueError(f"Unsupported result format: {image_format}")
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"Unsupported fsync mode: {fsync}")
+        self.pil_format, self.extension = _FORMATS[image_format]
+        self.max_workers = max_workers
+        self.fsync = fsync
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="result-writer")
+            return self._executor
+
+    def filename(self, prefix):
+        return f"{prefix}_{uuid.uuid4()}.{self.extension}"
+
+    def submit(self, image, prefix, directory, then=None):
+        """
+        Planifie l'écriture de `image` dans `directory` (nom `<prefix>_<uuid>.<ext>`).
+        Retourne un Future : then(filename) (ou filename), une fois le fichier en place.
+        """
+        output_filename = self.filename(prefix)
+        return self._pool().submit(self._write, image, directory, output_filename, then)
+
+    def _write(self, image, directory, output_filename, then):
+        path = os.path.join(directory, output_filename)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        if self.pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        with metrics.stage("encode", format=self.extension):
+            image.save(buffer, format=self.pil_format, **save_options(self.pil_format))
+        try:
+            with metrics.stage("save"):
+                with open(tmp_path, "wb") as f:
+                    f.write(buffer.getbuffer())
+                    if self.fsync == "1":
+                        # Données sur disque avant que le nom final ne pointe vers elles
+                        f.flush()
+                        with metrics.stage("fsync"):
+                            os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.fsync == "1":
+            self._pool().submit(self._sync_directory, directory)
+        elif self.fsync == "deferred":
+            self._pool().submit(self._sync_published, path, directory)
+        return then(output_filename) if then is not None else output_filename
+
+    def _sync_published(self, path, directory):
+        # Mode "deferred" : fichier déjà publié (et servi), rendu durable après coup
+        try:
+            with metrics.stage("fsync"):
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            print(f"⚠️ Could not fsync {path}: {e}")
+        self._sync_directory(directory)
+
+    def _sync_directory(self, directory):
+        # Rend le renommage durable (entrée du répertoire) ; non supporté sous Windows
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        try:
+            with metrics.stage("fsync_dir"):
+                dir_fd = os.open(directory or ".", os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+        except OSError as e:
+            print(f"⚠️ Could not fsync {directory}: {e}")
+
+
+# Singleton instance
+result_writer = ResultWriter()
@@ -0,0 +1,81 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# --- Configuration Miniatures ---
+GALLERY_DIR = "static/gallery"
+THUMBNAIL_DIR = os.path.join(GALLERY_DIR, "thumbs")
+THUMBNAIL_URL = "http://localhost:8000/static/gallery/thumbs"
+# Côté le plus long (px) de chaque déclinaison
+THUMBNAIL_SIZES = tuple(int(x) for x in os.getenv("THUMBNAIL_SIZES", "256,512").split(","))
+# "webp" (plus compact) ou "jpeg"
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def thumbnail_filename(filename, size):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}_{size}.{_EXTENSIONS.get(THUMBNAIL_FORMAT, 'webp')}"
+
+
+def thumbnail_urls(filename, sizes):
+    """{"256": url, "512": url} pour les tailles disponibles."""
+    return {str(size): f"{THUMBNAIL_URL}/{thumbnail_filename(filename, size)}" for size in sizes}
+
+
+def make_thumbnails(filename, directory=GALLERY_DIR, sizes=THUMBNAIL_SIZES):
+    """
+    Génère les miniatures d'une image de la galerie (écriture atomique).
+    Retourne la liste des tailles produites.
+    """
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    pil_format = "WEBP" if THUMBNAIL_FORMAT == "webp" else "JPEG"
+    with Image.open(os.path.join(directory, filename)) as source:
+        image = source.convert("RGB")
+
+    # Du plus grand au plus petit : chaque réduction part de la précédente
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.LANCZOS)
+        path = os.path.join(THUMBNAIL_DIR, thumbnail_filename(filename, size))
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp_path, format=pil_format, quality=THUMBNAIL_QUALITY, method=4 if pil_format == "WEBP" else 0)
+        os.replace(tmp_path, path)
+    return sorted(sizes)
+
+
+class ThumbnailGenerator:
+    """Pool de workers qui produit les miniatures en arrière-plan après chaque sauvegarde."""
+
+    def __init__(self, max_workers=THUMBNAIL_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="thumbnails")
+            return self._executor
+
+    def schedule(self, filename):
+        """Planifie la génération des miniatures puis met à jour l'index de la galerie."""
+        return self._pool().submit(self._run, filename)
+
+    def _run(self, filename):
+        from .gallery_index import gallery_index
+        try:
+            sizes = make_thumbnails(filename)
+            gallery_index.set_thumbnails(filename, sizes)
+            return sizes
+        except Exception as e:
+            print(f"⚠️ Could not create thumbnails for {filename}: {e}")
+            return []
+
+
+# Singleton instance
+thumbnail_generator = ThumbnailGenerator()
@@ -0,0 +1,93 @@
+import hashlib
+import io
+import os
+import uuid
+from .image_utils import decode_image_bytes
+from .metrics import metrics
+
+# --- Configuration Uploads ---
+UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+# Tag EXIF Orientation : 5 à 8 = rotation de 90° (largeur et hauteur inversées)
+EXIF_ORIENTATION = 0x0112
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class StoredUpload:
+    """Fichier uploadé : octets en mémoire, hash SHA-256 et chemin dédupliqué sur disque."""
+
+    def __init__(self, digest, path, data):
+        self.digest = digest
+        self.path = path
+        self.data = data
+        self._bgr = None
+
+    def decode(self):
+        """Image décodée (numpy BGR, format OpenCV / YOLO), décodée une seule fois."""
+        if self._bgr is None:
+            self._bgr = decode_image_bytes(self.data)
+        return self._bgr
+
+    def size(self):
+        """
+        (largeur, hauteur) lues dans l'en-tête, sans décoder l'image, après orientation
+        EXIF : cv2.imdecode applique la rotation, la taille doit être celle de decode().
+        """
+        from PIL import Image
+        with Image.open(io.BytesIO(self.data)) as img:
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+                return height, width
+            return width, height
+
+
+class UploadStore:
+    """
+    Stockage des uploads adressé par contenu.
+    Le corps est lu une seule fois en streaming, haché pendant l'écriture,
+    puis renommé atomiquement en uploads/<sha256><ext>. Deux uploads identiques
+    (même contenu) partagent le même fichier ; deux fichiers différents portant
+    le même nom ne s'écrasent plus.
+    """
+
+    def __init__(self, directory=UPLOAD_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    async def save(self, upload):
+        hasher = hashlib.sha256()
+        chunks = []
+        tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with metrics.stage("upload_read"), open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    chunks.append(chunk)
+
+            digest = hasher.hexdigest()
+            path = os.path.join(self.directory, f"{digest}{self._extension(upload.filename)}")
+            if os.path.exists(path):
+                # Déjà stocké : déduplication
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return StoredUpload(digest, path, b"".join(chunks))
+
+    @staticmethod
+    def _extension(filename):
+        extension = os.path.splitext(filename or "")[1].lower()
+        return extension if extension in ALLOWED_EXTENSIONS else ".bin"
+
+
+# Singleton instance
+upload_store = UploadStore()
@@ -1,10 +1,56 @@
-from ultralytics import YOLO
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
 import cv2
 import numpy as np
+from .cache import TieredCache, content_key
+from .model_registry import model_registry
+from .metrics import metrics
+
+YOLO_MODEL_ID = "yolov8n.pt"
+
+# Taille des lots envoyés à YOLO par /detect/batch
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "16"))
+
+# --- Cache des détections ---
+# Clé : hash de l'image + modèle + seuil de confiance.
+# Nombre max d'entrées en mémoire ; niveau disque optionnel (JSON) pour survivre aux redémarrages.
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "1024"))
+DETECTION_CACHE_DISK_MB = int(os.getenv("DETECTION_CACHE_DISK_MB", "0"))
+DETECTION_CACHE_DIR = os.getenv("DETECTION_CACHE_DIR", "cache/detections")
+
+# Mapping des classes COCO vers nos catégories (simplifié)
+# COCO classes: 56: chair, 57: couch, 58: potted plant, 59: bed, 60: dining table, 63: laptop, 64: mouse, 65: remote, 66: keyboard, 67: cell phone, 72: refrigerator, 73: book, 74: clock, 75: vase, 76: scissors, 77: teddy bear, 78: hair drier, 79: toothbrush
+INTERESTING_CLASSES = {
+    56: 'chair',
+    57: 'couch',
+    58: 'plant',
+    59: 'bed',
+    60: 'table',
+    75: 'vase'
+}
+
+detection_cache = TieredCache(
+    "detection",
+    # Borne en nombre d'entrées : chaque résultat compte pour 1
+    max_memory_bytes=DETECTION_CACHE_SIZE,
+    size_of=lambda objects: 1,
+    disk_dir=DETECTION_CACHE_DIR,
+    max_disk_bytes=DETECTION_CACHE_DISK_MB * 1024 * 1024,
+    serialize=lambda objects: json.dumps(objects).encode("utf-8"),
+    deserialize=lambda data: json.loads(data.decode("utf-8")),
+    extension="json",
+)
 
 class VisionService:
+    REGISTRY_NAME = "yolo"
+
     def __init__(self):
         self.model = None
+        # Le predictor Ultralytics n'est pas thread-safe
+        self._lock = threading.Lock()
         print("👁️ Vision Service initialized")
 
     def load_model(self):
@@ -13,56 +59,117 @@ class VisionService:
             return self.model
         
         print("⏳ Loading YOLOv8...")
+        started = time.perf_counter()
         try:
+            # Import à la demande : ultralytics (et torch) ne ralentissent pas le démarrage
+            from ultralytics import YOLO
+
             # Utilise 'yolov8n.pt' (nano) pour la rapidité. 
             # Il sera téléchargé automatiquement au premier lancement.
-            self.model = YOLO('yolov8n.pt') 
+            self.model = YOLO(YOLO_MODEL_ID) 
+            model_registry.register(self.REGISTRY_NAME, {"model": self.model.model}, on_evict=self.unload)
+            metrics.observe("model_load", time.perf_counter() - started, model=self.REGISTRY_NAME)
             print("✅ YOLOv8 loaded!")
             return self.model
         except Exception as e:
             print(f"❌ Error loading YOLO: {e}")
             return None
 
-    def detect_objects(self, image_path, conf_threshold=0.25):
-        """Détecte les objets dans une image."""
-        if self.model is None:
-            self.load_model()
+    def unload(self):
+        """Appelé par le registre lors d'une éviction."""
+        self.model = None
 
-        results = self.model(image_path, conf=conf_threshold)
-        
-        detected_objects = []
-        
-        # Mapping des classes COCO vers nos catégories (simplifié)
-        # COCO classes: 56: chair, 57: couch, 58: potted plant, 59: bed, 60: dining table, 63: laptop, 64: mouse, 65: remote, 66: keyboard, 67: cell phone, 72: refrigerator, 73: book, 74: clock, 75: vase, 76: scissors, 77: teddy bear, 78: hair drier, 79: toothbrush
-        INTERESTING_CLASSES = {
-            56: 'chair',
-            57: 'couch',
-            58: 'plant',
-            59: 'bed',
-            60: 'table',
-            75: 'vase'
-        }
-
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                cls_id = int(box.cls[0])
-                if cls_id in INTERESTING_CLASSES:
-                    # Coordonnées normalisées (0-1) pour le frontend
-                    # box.xywhn retourne [x_center, y_center, width, height] normalisé
-                    x, y, w, h = box.xywhn[0].tolist()
-                    
-                    detected_objects.append({
-                        "label": INTERESTING_CLASSES[cls_id],
-                        "confidence": float(box.conf[0]),
-                        "position": {
-                            "x": x * 100, # Pourcentage CSS
-                            "y": y * 100
-                        },
-                        "box": [x, y, w, h]
-                    })
-        
-        return detected_objects
+    @contextmanager
+    def _pinned_model(self):
+        """
+        Modèle protégé de l'éviction le temps de l'inférence. Le chargement et la
+        vérification se font sous model_registry.use() : s'il a été évincé entre-temps,
+        il est rechargé avant l'appel (jamais de self.model à None en cours de route).
+        """
+        while True:
+            with model_registry.use(self.REGISTRY_NAME) as pinned:
+                model = self.model
+                if pinned and model is not None:
+                    yield model
+                    return
+            model = self.model
+            if model is not None:
+                # Chargé mais plus enregistré (éviction en cours) : ré-enregistré avant l'épinglage
+                model_registry.register(self.REGISTRY_NAME, {"model": model.model}, on_evict=self.unload)
+            elif self.load_model() is None:
+                raise RuntimeError("YOLO model unavailable")
+
+    @staticmethod
+    def _cache_key(digest, conf_threshold):
+        return content_key(digest, YOLO_MODEL_ID, conf_threshold) if digest else None
+
+    def cached_detections(self, digest, conf_threshold=0.25):
+        """Résultat en cache pour ce digest (None si absent) : évite même le décodage."""
+        key = self._cache_key(digest, conf_threshold)
+        return detection_cache.get(key) if key else None
+
+    def detect_objects(self, image, conf_threshold=0.25, digest=None):
+        """
+        Détecte les objets dans une image (chemin ou tableau numpy BGR déjà décodé).
+        Si `digest` (SHA-256 du fichier) est fourni, le résultat est mis en cache.
+        """
+        return self.detect_batch([image], conf_threshold, digests=[digest])[0]
+
+    def detect_batch(self, images, conf_threshold=0.25, batch_size=DETECTION_BATCH_SIZE, digests=None):
+        """
+        Détecte les objets dans plusieurs images (tableaux numpy BGR) en passant
+        les images à YOLO par lots. Retourne une liste de détections par image.
+        Les images dont le digest est en cache ne passent pas par le modèle.
+        """
+        digests = digests or [None] * len(images)
+        keys = [self._cache_key(digest, conf_threshold) for digest in digests]
+        detections = [detection_cache.get(key) if key else None for key in keys]
+        pending = [i for i, objects in enumerate(detections) if objects is None]
+        if not pending:
+            return detections
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            with self._lock, self._pinned_model() as model, metrics.stage("inference", model=self.REGISTRY_NAME):
+                # Filtrage des classes directement dans le NMS de YOLO
+                results = model(
+                    [images[i] for i in chunk],
+                    conf=conf_threshold,
+                    classes=list(INTERESTING_CLASSES),
+                    verbose=False
+                )
+            for i, r in zip(chunk, results):
+                detections[i] = self._postprocess(r)
+                if keys[i]:
+                    detection_cache.put(keys[i], detections[i])
+        return detections
+
+    @staticmethod
+    def _postprocess(result):
+        """Conversion vectorisée des boîtes (un seul transfert par tenseur)."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return []
+
+        cls_ids = boxes.cls.cpu().numpy().astype(np.int64)
+        confidences = boxes.conf.cpu().numpy().astype(np.float64)
+        # box.xywhn : [x_center, y_center, width, height] normalisé (0-1) pour le frontend
+        xywhn = boxes.xywhn.cpu().numpy().astype(np.float64)
+        # Pourcentage CSS
+        positions = xywhn[:, :2] * 100
+
+        return [
+            {
+                "label": INTERESTING_CLASSES[cls_id],
+                "confidence": confidence,
+                "position": {"x": x, "y": y},
+                "box": box
+            }
+            for cls_id, confidence, (x, y), box in zip(
+                cls_ids.tolist(), confidences.tolist(), positions.tolist(), xywhn.tolist()
+            )
+            if cls_id in INTERESTING_CLASSES
+        ]
 
 # Singleton instance
 vision_service = VisionService()
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+# --- Configuration Warm-up ---
+# Modèles chargés au démarrage (en arrière-plan) : controlnet, inpainting, yolo.
+# Vide = chargement paresseux à la première requête (instance prête immédiatement).
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "controlnet,inpainting,yolo").split(",") if m.strip()]
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class WarmupState:
+    """Etat du warm-up, exposé par /health/ready."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.status = STATUS_PENDING if WARMUP_MODELS else STATUS_READY
+        self.import_seconds = None
+        self.started_at = None
+        self.finished_at = None
+        # modèle -> {"load_seconds", "inference_seconds", "error"}
+        self.models = {}
+
+    @property
+    def ready(self):
+        return self.status == STATUS_READY
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "status": self.status,
+                "import_seconds": self.import_seconds,
+                "warmup_seconds": (
+                    self.finished_at - self.started_at
+                    if self.started_at and self.finished_at else None
+                ),
+                "models": dict(self.models),
+            }
+
+    def record(self, name, **values):
+        with self._lock:
+            self.models.setdefault(name, {}).update(values)
+
+
+warmup_state = WarmupState()
+
+
+def _warm_controlnet():
+    from PIL import Image
+    from .ml_service import ml_service
+
+    started = time.perf_counter()
+    if ml_service.load_model() is None:
+        raise RuntimeError("ControlNet pipeline could not be loaded")
+    loaded = time.perf_counter()
+    # Inférence minimale : 1 step sur une image de contrôle 64x64
+    ml_service.generate("warmup", Image.new("RGB", (64, 64)), steps=1)
+    print(f"📝 {ml_service.warm_prompts()} prompt embeddings precomputed")
+    return loaded - started, time.perf_counter() - loaded
+
+
+def _warm_inpainting():
+    from PIL import Image
+    from .ml_service import inpainting_service
+
+    started = time.perf_counter()
+    if inpainting_service.load_model() is None:
+        raise RuntimeError("Inpainting pipeline could not be loaded")
+    loaded = time.perf_counter()
+    inpainting_service.inpaint(
+        "warmup", Image.new("RGB", (64, 64)), Image.new("RGB", (64, 64), "white"), steps=1
+    )
+    print(f"📝 {inpainting_service.warm_prompts()} prompt embeddings precomputed")
+    return loaded - started, time.perf_counter() - loaded
+
+
+def _warm_yolo():
+    import numpy as np
+    from .vision_service import vision_service
+
+    started = time.perf_counter()
+    if vision_service.load_model() is None:
+        raise RuntimeError("YOLO could not be loaded")
+    loaded = time.perf_counter()
+    vision_service.detect_objects(np.zeros((64, 64, 3), dtype=np.uint8))
+    return loaded - started, time.perf_counter() - loaded
+
+
+WARMERS = {
+    "controlnet": _warm_controlnet,
+    "inpainting": _warm_inpainting,
+    "yolo": _warm_yolo,
+}
+
+
+def run_warmup():
+    """Charge les modèles configurés et lance une inférence factice (worker d'inférence)."""
+    warmup_state.status = STATUS_RUNNING
+    warmup_state.started_at = time.time()
+    failed = False
+    for name in WARMUP_MODELS:
+        warmer = WARMERS.get(name)
+        if warmer is None:
+            print(f"⚠️ Unknown warm-up model: {name}")
+            continue
+        print(f"🔥 Warming up {name}...")
+        try:
+            load_seconds, inference_seconds = warmer()
+            warmup_state.record(name, load_seconds=load_seconds, inference_seconds=inference_seconds)
+            print(f"✅ {name} warm: load {load_seconds:.1f}s, first inference {inference_seconds:.1f}s")
+        except Exception as e:
+            failed = True
+            warmup_state.record(name, error=str(e))
+            print(f"❌ Warm-up of {name} failed: {e}")
+    warmup_state.finished_at = time.time()
+    warmup_state.status = STATUS_FAILED if failed else STATUS_READY
+    print(f"🔥 Warm-up {warmup_state.status} in {warmup_state.finished_at - warmup_state.started_at:.1f}s")
+
+
+def start_warmup():
+    """Planifie le warm-up sur le worker d'inférence (premier job de la file)."""
+    if not WARMUP_MODELS:
+        return
+    from .job_queue import job_queue
+    job_queue.submit("warmup", run_warmup)
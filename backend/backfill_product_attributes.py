@@ -0,0 +1,49 @@
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, engine, ensure_schema
+from app.models import Product
+from app.services.image_utils import compute_product_attributes
+from app.services.product_embeddings import load_product_image
+
+# Ensure tables exist
+ensure_schema(engine)
+
+# Nombre d'images analysées par passe NumPy
+CHUNK_SIZE = 256
+
+def backfill(force=False):
+    """Calcule couleur dominante, palette, ratio et forme des produits du catalogue."""
+    db: Session = SessionLocal()
+    try:
+        query = db.query(Product)
+        if not force:
+            query = query.filter(Product.shape_class.is_(None))
+        products = query.all()
+        print(f"Found {len(products)} products to analyse.")
+
+        count = 0
+        for start in range(0, len(products), CHUNK_SIZE):
+            chunk, images = [], []
+            for product in products[start:start + CHUNK_SIZE]:
+                try:
+                    images.append(load_product_image(product.image))
+                    chunk.append(product)
+                except Exception as e:
+                    print(f"❌ {product.name}: {e}")
+
+            # Une seule passe vectorisée pour tout le lot
+            for product, attributes in zip(chunk, compute_product_attributes(images)):
+                for column, value in attributes.items():
+                    setattr(product, column, value)
+                count += 1
+            db.commit()
+
+        print(f"✅ Successfully analysed {count} products.")
+
+    except Exception as e:
+        print(f"❌ Error during backfill: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import sys
+    backfill(force="--force" in sys.argv)
@@ -0,0 +1,33 @@
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, engine, ensure_schema
+from app.models import Product
+from app.services.product_embeddings import product_embeddings
+
+# Ensure tables exist
+ensure_schema(engine)
+
+def backfill():
+    """Calcule les embeddings IP-Adapter des produits qui n'en ont pas encore."""
+    db: Session = SessionLocal()
+    try:
+        pending = [
+            (product.id, product.name, product.image)
+            for product in db.query(Product).filter(Product.ip_adapter_embeds.is_(None)).all()
+        ]
+    finally:
+        db.close()
+
+    print(f"Found {len(pending)} products without embeddings.")
+
+    count = 0
+    for product_id, name, image_url in pending:
+        try:
+            product_embeddings.compute(product_id, image_url)
+            count += 1
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+
+    print(f"✅ Successfully computed embeddings for {count} products.")
+
+if __name__ == "__main__":
+    backfill()
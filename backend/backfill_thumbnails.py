@@ -0,0 +1,45 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from app.database import SessionLocal, engine, ensure_schema
+from app.models import GalleryImage
+from app.services.gallery_index import gallery_index
+from app.services.thumbnails import make_thumbnails, THUMBNAIL_SIZES, THUMBNAIL_WORKERS, GALLERY_DIR
+
+# Ensure tables exist
+ensure_schema(engine)
+
+def _process(filename):
+    try:
+        sizes = make_thumbnails(filename)
+        gallery_index.set_thumbnails(filename, sizes)
+        return True
+    except Exception as e:
+        print(f"❌ {filename}: {e}")
+        return False
+
+def backfill():
+    """Génère les miniatures manquantes pour toutes les images de static/gallery."""
+    if not os.path.isdir(GALLERY_DIR):
+        print(f"❌ {GALLERY_DIR} not found.")
+        return
+
+    # Indexe les fichiers existants si ce n'est pas déjà fait
+    gallery_index.ensure_backfilled()
+
+    expected = ",".join(str(size) for size in sorted(THUMBNAIL_SIZES))
+    db = SessionLocal()
+    try:
+        pending = [
+            row.filename for row in db.query(GalleryImage).all()
+            if row.thumbnail_sizes != expected and os.path.exists(os.path.join(GALLERY_DIR, row.filename))
+        ]
+    finally:
+        db.close()
+
+    print(f"Found {len(pending)} images without thumbnails.")
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as pool:
+        count = sum(pool.map(_process, pending))
+    print(f"✅ Successfully created thumbnails for {count} images.")
+
+if __name__ == "__main__":
+    backfill()
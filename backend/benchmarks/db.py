@@ -0,0 +1,225 @@
+"""
+Débit de lectures concurrentes (/products, /gallery) pendant des écritures admin sur le
+catalogue. Compare trois configurations de la base, chacune dans un processus séparé
+(la configuration est lue à l'import de app.database) :
+    legacy : session sync, journal DELETE, synchronous FULL (réglages SQLite historiques)
+    wal    : session sync, WAL et pragmas
+    async  : SQLAlchemy async + aiosqlite, WAL et pragmas (DATABASE_ASYNC=1)
+
+Depuis backend/ :
+    python -m benchmarks.db
+    python -m benchmarks.db --modes legacy,async --concurrency 64 --duration 20 --write-rps 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    "legacy": {"DATABASE_ASYNC": "0", "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "wal": {"DATABASE_ASYNC": "0"},
+    "async": {"DATABASE_ASYNC": "1"},
+}
+# Part des lectures envoyées au catalogue (le reste à la galerie)
+CATALOG_READ_SHARE = 0.75
+PAGE_SIZE = 50
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LuminaSpace concurrent database read benchmark")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Configurations comparées ({', '.join(MODES)})")
+    parser.add_argument("--concurrency", type=int, default=32, help="Lecteurs simultanés")
+    parser.add_argument("--duration", type=float, default=10, help="Durée par configuration (s)")
+    parser.add_argument("--write-rps", type=float, default=5, help="Écritures admin par seconde (0 = lectures seules)")
+    parser.add_argument("--catalog-size", type=int, default=10000)
+    parser.add_argument("--gallery-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Rapport JSON")
+    # Usage interne : mesure d'une configuration dans un sous-processus
+    parser.add_argument("--child", choices=list(MODES), help=argparse.SUPPRESS)
+    parser.add_argument("--report-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def _admin_writer(write_rps, stop, latencies):
+    """Ajouts produits au rythme `write_rps`, comme POST /products (le commit change la version du catalogue)."""
+    from app.database import SessionLocal
+    from app.models import Product
+    from .endpoints import CATEGORIES
+
+    i = 0
+    while not stop.wait(1 / write_rps):
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            db.add(Product(
+                id=f"admin-{i:06d}",
+                name=f"Nouveau produit {i}",
+                price="199 €",
+                image=f"http://localhost:8000/static/products/admin-{i:06d}.jpg",
+                category=CATEGORIES[i % len(CATEGORIES)],
+                link=f"https://example.com/n/{i}",
+                match="100%",
+            ))
+            db.commit()
+        finally:
+            db.close()
+        latencies.append((time.perf_counter() - started) * 1000)
+        i += 1
+
+
+async def _reader(client, deadline, records, max_rowid, gallery_size):
+    while time.perf_counter() < deadline:
+        if random.random() < CATALOG_READ_SHARE:
+            # Curseurs aléatoires : presque toujours un miss du cache catalogue, donc une requête SQL
+            url = f"/products?limit={PAGE_SIZE}&cursor={random.randint(0, max_rowid)}"
+        else:
+            url = f"/gallery?limit={PAGE_SIZE}&cursor={random.randint(PAGE_SIZE, gallery_size)}"
+        started = time.perf_counter()
+        try:
+            status = (await client.get(url)).status_code
+        except Exception as e:
+            status = f"exception: {type(e).__name__}"
+        records.append((status, (time.perf_counter() - started) * 1000))
+
+
+async def measure_mode(args):
+    import httpx
+    from fastapi import FastAPI
+    from sqlalchemy import text
+    from app.database import engine, ensure_schema
+    from app.routers import products, gallery
+    from app.services.gallery_index import gallery_index
+    from .endpoints import _seed_catalog, _fill_gallery
+    from .load import percentile, probe_loop_lag
+
+    ensure_schema(engine)
+    _seed_catalog(args.catalog_size)
+    os.makedirs(gallery_index.directory, exist_ok=True)
+    _fill_gallery(gallery_index.directory, args.gallery_size)
+    gallery_index.ensure_backfilled()
+    with engine.connect() as conn:
+        max_rowid = conn.execute(text("SELECT max(rowid) FROM products")).scalar() or 0
+        journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+
+    app = FastAPI()
+    app.include_router(products.router)
+    app.include_router(gallery.router)
+
+    records, lag_samples, write_latencies = [], [], []
+    stop_probe, stop_writer = asyncio.Event(), threading.Event()
+    writer = None
+    if args.write_rps > 0:
+        writer = threading.Thread(target=_admin_writer, args=(args.write_rps, stop_writer, write_latencies), daemon=True)
+
+    print(f"📚 {args.child}: journal {journal_mode}, {args.concurrency} readers for {args.duration}s, "
+          f"{args.write_rps} writes/s")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lumina") as client:
+        prober = asyncio.create_task(probe_loop_lag(lag_samples, stop_probe))
+        if writer is not None:
+            writer.start()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            _reader(client, deadline, records, max_rowid, args.gallery_size) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        stop_probe.set()
+        stop_writer.set()
+        await prober
+        if writer is not None:
+            writer.join()
+
+    ok = sorted(latency for status, latency in records if status == 200)
+    lag = sorted(lag_samples)
+    writes = sorted(write_latencies)
+    return {
+        "mode": args.child,
+        "journal_mode": journal_mode,
+        "reads": len(records),
+        "errors": len(records) - len(ok),
+        "reads_per_s": len(ok) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(ok, 0.50),
+        "p95_ms": percentile(ok, 0.95),
+        "p99_ms": percentile(ok, 0.99),
+        "loop_lag_p99_ms": percentile(lag, 0.99),
+        "loop_lag_max_ms": lag[-1] if lag else None,
+        "writes": len(writes),
+        "write_p95_ms": percentile(writes, 0.95),
+    }
+
+
+def run_child(args):
+    # Base, galerie et caches isolés dans un dossier temporaire
+    workdir = tempfile.mkdtemp(prefix=f"lumina-db-{args.child}-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    report = asyncio.run(measure_mode(args))
+    with open(args.report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+
+
+def run_mode(mode, args):
+    """Mesure une configuration dans un sous-processus ; None si elle a échoué (ex. aiosqlite absent)."""
+    fd, report_file = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    command = [
+        sys.executable, "-m", "benchmarks.db", "--child", mode, "--report-file", report_file,
+        "--concurrency", str(args.concurrency), "--duration", str(args.duration),
+        "--write-rps", str(args.write_rps), "--catalog-size", str(args.catalog_size),
+        "--gallery-size", str(args.gallery_size), "--seed", str(args.seed),
+    ]
+    env = {**os.environ, **MODES[mode]}
+    try:
+        if subprocess.run(command, cwd=BACKEND_DIR, env=env).returncode != 0:
+            print(f"❌ {mode} failed")
+            return None
+        with open(report_file, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(report_file)
+
+
+def print_report(reports):
+    def fmt(value):
+        return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"\n{'mode':<8} {'journal':<8} {'reads/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'lag p99':>9} {'writes':>7} {'w p95 ms':>9}")
+    for r in reports:
+        print(f"{r['mode']:<8} {r['journal_mode']:<8} {fmt(r['reads_per_s'])} {fmt(r['p50_ms'])} "
+              f"{fmt(r['p95_ms'])} {fmt(r['p99_ms'])} {r['errors']:>7} {fmt(r['loop_lag_p99_ms'])} "
+              f"{r['writes']:>7} {fmt(r['write_p95_ms'])}")
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    if args.child:
+        run_child(args)
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        sys.exit(f"Unknown mode(s): {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output) if args.output else None
+
+    reports = [report for report in (run_mode(mode, args) for mode in modes) if report is not None]
+    print_report(reports)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": reports}, f, indent=2)
+        print(f"💾 Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import os
+import time
+from .harness import measure
+
+# Tailles de catalogue et de galerie
+CATALOG_SIZES = [10, 1000, 10000, 100000]
+QUICK_CATALOG_SIZES = CATALOG_SIZES[:2]
+GALLERY_SIZES = [10, 1000, 10000]
+QUICK_GALLERY_SIZES = GALLERY_SIZES[:2]
+CATEGORIES = ["Canapé", "Fauteuil", "Table", "Lampe", "Tapis", "Chaise", "Étagère", "Lit"]
+PAGE_SIZE = 50
+
+
+def _client(*routers):
+    """Application minimale (seulement les routers mesurés) et client de test, sans warm-up des modèles."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.database import engine, ensure_schema
+
+    ensure_schema(engine)
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+    return TestClient(app)
+
+
+def _get(client, url, headers=None, expected=200):
+    response = client.get(url, headers=headers)
+    if response.status_code != expected:
+        raise RuntimeError(f"GET {url} -> {response.status_code}")
+    return response
+
+
+def _seed_catalog(size):
+    from app.database import SessionLocal
+    from app.models import Product
+
+    db = SessionLocal()
+    try:
+        db.query(Product).delete()
+        db.execute(Product.__table__.insert(), [
+            {
+                "id": f"bench-{i:06d}",
+                "name": f"Produit {i}",
+                "price": f"{100 + i % 900} €",
+                "image": f"http://localhost:8000/static/products/bench-{i:06d}.jpg",
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "link": f"https://example.com/p/{i}",
+                "match": "100%",
+            }
+            for i in range(size)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _middle_rowid(size):
+    """Curseur (rowid) du milieu du catalogue : page profonde sans OFFSET."""
+    from sqlalchemy import text
+    from app.database import engine
+
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT rowid FROM products ORDER BY rowid LIMIT 1 OFFSET :offset"), {"offset": size // 2}
+        ).scalar()
+
+
+def run_catalog(results, quick=False, repeat=20):
+    from app.routers import products
+    from app.services.catalog_cache import catalog_cache
+
+    print("🛋️ Catalog (/products)")
+    client = _client(products.router)
+    for size in QUICK_CATALOG_SIZES if quick else CATALOG_SIZES:
+        _seed_catalog(size)
+        catalog_cache.clear()
+        n = max(3, repeat // 4) if size >= 10000 else repeat
+        middle = _middle_rowid(size)
+
+        # Catalogue complet : requête SQL + sérialisation (cache invalidé), puis réponse en cache
+        results.add(f"catalog.full_list[{size}]", measure(
+            lambda: _get(client, "/products"), repeat=n, setup=catalog_cache.clear
+        ))
+        results.add(f"catalog.full_list_cached[{size}]", measure(lambda: _get(client, "/products"), repeat=n))
+        etag = _get(client, "/products").headers["ETag"]
+        results.add(f"catalog.full_list_304[{size}]", measure(
+            lambda: _get(client, "/products", headers={"If-None-Match": etag}, expected=304), repeat=n
+        ))
+        results.add(f"catalog.first_page[{size}]", measure(
+            lambda: _get(client, f"/products?limit={PAGE_SIZE}"), repeat=repeat, setup=catalog_cache.clear
+        ))
+        if middle:
+            results.add(f"catalog.middle_page[{size}]", measure(
+                lambda: _get(client, f"/products?limit={PAGE_SIZE}&cursor={middle}"),
+                repeat=repeat, setup=catalog_cache.clear
+            ))
+        results.add(f"catalog.category_page[{size}]", measure(
+            lambda: _get(client, f"/products?limit={PAGE_SIZE}&category={CATEGORIES[1]}"),
+            repeat=repeat, setup=catalog_cache.clear
+        ))
+        results.add(f"catalog.projected_list[{size}]", measure(
+            lambda: _get(client, "/products?fields=id,name,image"), repeat=n, setup=catalog_cache.clear
+        ))
+
+
+def _fill_gallery(directory, size):
+    """Fichiers vides nommés comme les sorties réelles (le listing ne lit que les noms et mtime)."""
+    for filename in os.listdir(directory):
+        os.remove(os.path.join(directory, filename))
+    now = time.time()
+    for i in range(size):
+        kind = "generated" if i % 3 else "inpainted"
+        path = os.path.join(directory, f"{kind}_{i:06d}.png")
+        open(path, "wb").close()
+        os.utime(path, (now - size + i, now - size + i))
+
+
+def run_gallery(results, quick=False, repeat=20):
+    from app.database import SessionLocal
+    from app.models import GalleryImage
+    from app.routers import gallery
+    from app.services.gallery_index import gallery_index
+
+    def reset_index():
+        db = SessionLocal()
+        try:
+            db.query(GalleryImage).delete()
+            db.commit()
+        finally:
+            db.close()
+        gallery_index._backfilled = False
+
+    print("🖼️ Gallery (/gallery)")
+    client = _client(gallery.router)
+    os.makedirs(gallery_index.directory, exist_ok=True)
+    for size in QUICK_GALLERY_SIZES if quick else GALLERY_SIZES:
+        _fill_gallery(gallery_index.directory, size)
+        n = max(3, repeat // 4) if size >= 10000 else repeat
+
+        # Premier appel après démarrage : indexation du dossier
+        results.add(f"gallery.backfill[{size}]", measure(
+            gallery_index.ensure_backfilled, repeat=n, setup=reset_index
+        ))
+        reset_index()
+        first = _get(client, "/gallery")
+        results.add(f"gallery.first_page[{size}]", measure(lambda: _get(client, "/gallery"), repeat=repeat))
+        cursor = first.json()["next_cursor"]
+        if cursor:
+            results.add(f"gallery.next_page[{size}]", measure(
+                lambda: _get(client, f"/gallery?cursor={cursor}"), repeat=repeat
+            ))
+        results.add(f"gallery.kind_page[{size}]", measure(lambda: _get(client, "/gallery?kind=inpainted"), repeat=repeat))
+        etag = first.headers["ETag"]
+        results.add(f"gallery.first_page_304[{size}]", measure(
+            lambda: _get(client, "/gallery", headers={"If-None-Match": etag}, expected=304), repeat=repeat
+        ))
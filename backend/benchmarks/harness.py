@@ -0,0 +1,69 @@
+import time
+
+# Nombre de mesures par cas (hors échauffement)
+DEFAULT_REPEAT = 20
+
+
+def measure(fn, repeat=DEFAULT_REPEAT, warmup=1, setup=None):
+    """
+    Chronomètre `fn` `repeat` fois (après `warmup` appels non mesurés).
+    `setup` est appelé avant chaque appel, hors chronométrage (ex. vider un cache).
+    Retourne les statistiques en millisecondes.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return {
+        "median_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "min_ms": samples[0],
+        "mean_ms": sum(samples) / len(samples),
+        "repeat": repeat,
+    }
+
+
+class Results:
+    """Résultats nommés `suite.cas[paramètre]` -> statistiques, affichés au fil de l'eau."""
+
+    def __init__(self):
+        self.cases = {}
+
+    def add(self, name, stats):
+        self.cases[name] = stats
+        print(f"  {name:<55} median {stats['median_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare les médianes aux résultats de référence.
+    Retourne la liste des régressions (ratio > 1 + threshold).
+    """
+    regressions = []
+    print(f"\n{'case':<55} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, stats in sorted(current.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<55} {'-':>12} {stats['median_ms']:>10.3f}ms {'new':>8}")
+            continue
+        ratio = stats["median_ms"] / reference["median_ms"] if reference["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ❌"
+            regressions.append((name, ratio))
+        elif ratio < 1 - threshold:
+            flag = "  ✅"
+        print(f"{name:<55} {reference['median_ms']:>10.3f}ms {stats['median_ms']:>10.3f}ms {ratio:>7.2f}x{flag}")
+    for name in sorted(set(baseline) - set(current)):
+        print(f"{name:<55} {baseline[name]['median_ms']:>10.3f}ms {'-':>12} {'missing':>8}")
+    return regressions
@@ -0,0 +1,260 @@
+"""
+Générateur de charge de bout en bout : rejoue un mélange de trafic (arrivées de Poisson,
+boucle ouverte) contre l'application FastAPI et mesure latences p50/p95/p99, débit
+atteint et retard de l'event loop.
+
+Par défaut, l'application tourne dans le même processus avec des backends d'inférence
+factices (latence synthétique réglable, voir benchmarks/stubs.py) : pas de GPU ni de modèle.
+
+Depuis backend/ :
+    python -m benchmarks.load --rps 20 --duration 60
+    python -m benchmarks.load --mix generate=1,inpaint=1,detect=4,products=10,gallery=4 --generate-ms 3000
+    python -m benchmarks.load --url http://localhost:8000 --rps 2     # serveur réel (vrais modèles)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("generate", "inpaint", "detect", "products", "gallery")
+DEFAULT_MIX = "generate=1,inpaint=1,detect=4,products=10,gallery=4"
+STYLES = ("scandi", "indus", "japandi", "cyber", "lux")
+# Intervalle de la sonde de retard de l'event loop (secondes)
+LAG_PROBE_INTERVAL = 0.01
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LuminaSpace load generator")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Poids par endpoint ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--rps", type=float, default=10, help="Débit cible (requêtes/s, arrivées de Poisson)")
+    parser.add_argument("--duration", type=float, default=30, help="Durée d'injection (s)")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="Attente max des requêtes en vol (s)")
+    parser.add_argument("--url", help="Serveur cible ; sinon application en processus avec backends factices")
+    parser.add_argument("--distinct-images", type=int, default=8, help="Nombre de photos différentes envoyées")
+    parser.add_argument("--image-size", default="1024x768", help="Taille des photos synthétiques")
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--gallery-size", type=int, default=500)
+    parser.add_argument("--generate-ms", type=float, default=800, help="Latence factice d'une génération")
+    parser.add_argument("--inpaint-ms", type=float, default=1200, help="Latence factice d'un inpainting")
+    parser.add_argument("--detect-ms", type=float, default=40, help="Latence factice d'une détection")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Bruit relatif des latences factices")
+    parser.add_argument("--batch-cost", type=float, default=0.6, help="Coût relatif d'une image de plus dans un batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Rapport JSON")
+    return parser.parse_args()
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            sys.exit(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def build_payloads(args):
+    """Photos synthétiques (JPEG) et masque (PNG) préencodés : le client ne coûte presque rien."""
+    import cv2
+    import numpy as np
+    from .preprocessing import synthetic_room
+
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    photos = []
+    for seed in range(args.distinct_images):
+        ok, buffer = cv2.imencode(".jpg", synthetic_room(width, height, seed=seed))
+        photos.append(buffer.tobytes())
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.rectangle(mask, (width // 3, height // 2), (width // 2, height * 3 // 4), 255, thickness=-1)
+    _, buffer = cv2.imencode(".png", mask)
+    return photos, buffer.tobytes()
+
+
+def make_request(endpoint, photos, mask):
+    """(méthode, url, kwargs httpx) d'une requête de `endpoint`."""
+    photo = random.choice(photos)
+    if endpoint == "generate":
+        return "POST", "/generate", {
+            "files": {"file": ("room.jpg", photo, "image/jpeg")},
+            "data": {"prompt": "interior design", "style": random.choice(STYLES)},
+        }
+    if endpoint == "inpaint":
+        return "POST", "/inpaint", {
+            "files": {"image": ("room.jpg", photo, "image/jpeg"), "mask": ("mask.png", mask, "image/png")},
+            "data": {"prompt": "clean background, empty room, wall, floor, interior design", "crop": "true"},
+        }
+    if endpoint == "detect":
+        return "POST", "/detect", {"files": {"file": ("room.jpg", photo, "image/jpeg")}}
+    if endpoint == "products":
+        return "GET", random.choice(["/products", "/products?limit=50", "/products?limit=50&category=Lampe"]), {}
+    return "GET", random.choice(["/gallery", "/gallery?kind=generated"]), {}
+
+
+async def probe_loop_lag(samples, stop):
+    """Retard de réveil d'un sleep court : temps pendant lequel l'event loop était bloqué."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        samples.append((time.perf_counter() - started - LAG_PROBE_INTERVAL) * 1000)
+
+
+async def send(client, endpoint, request, records):
+    method, url, kwargs = request
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+    except Exception as e:
+        status = f"exception: {type(e).__name__}"
+    records.append({"endpoint": endpoint, "status": status, "latency_ms": (time.perf_counter() - started) * 1000})
+
+
+async def run_load(args, client, weights, photos, mask):
+    records, lag_samples, tasks = [], [], []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe_loop_lag(lag_samples, stop))
+    names, values = list(weights), list(weights.values())
+
+    print(f"🚦 {args.rps} req/s for {args.duration}s, mix {weights}")
+    started = time.perf_counter()
+    next_arrival = started
+    while True:
+        next_arrival += random.expovariate(args.rps)
+        if next_arrival - started > args.duration:
+            break
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        endpoint = random.choices(names, values)[0]
+        tasks.append(asyncio.create_task(send(client, endpoint, make_request(endpoint, photos, mask), records)))
+
+    injected = time.perf_counter() - started
+    print(f"⏳ Draining {sum(not task.done() for task in tasks)} in-flight requests...")
+    done, pending = await asyncio.wait(tasks, timeout=args.drain_timeout) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    return records, lag_samples, injected, elapsed, len(pending)
+
+
+def summarize(records, lag_samples, injected, elapsed, timed_out):
+    def stats(group):
+        ok = sorted(r["latency_ms"] for r in group if isinstance(r["status"], int) and r["status"] < 400)
+        return {
+            "sent": len(group),
+            "ok": len(ok),
+            "rejected": sum(r["status"] == 503 for r in group),
+            "errors": sum(not isinstance(r["status"], int) or (r["status"] >= 400 and r["status"] != 503) for r in group),
+            "rps": len(ok) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(ok, 0.50),
+            "p95_ms": percentile(ok, 0.95),
+            "p99_ms": percentile(ok, 0.99),
+            "max_ms": ok[-1] if ok else None,
+        }
+
+    lag = sorted(lag_samples)
+    return {
+        "duration_s": injected,
+        "elapsed_s": elapsed,
+        "offered_rps": len(records) / injected if injected else 0.0,
+        "timed_out": timed_out,
+        "overall": stats(records),
+        "endpoints": {
+            name: stats([r for r in records if r["endpoint"] == name])
+            for name in ENDPOINTS if any(r["endpoint"] == name for r in records)
+        },
+        "event_loop_lag_ms": {
+            "p50": percentile(lag, 0.50),
+            "p99": percentile(lag, 0.99),
+            "max": lag[-1] if lag else None,
+        },
+    }
+
+
+def print_report(report):
+    def fmt(value):
+        return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"\n{'endpoint':<10} {'sent':>6} {'ok':>6} {'503':>5} {'err':>5} {'rps':>7} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["overall"])]
+    for name, s in rows:
+        print(f"{name:<10} {s['sent']:>6} {s['ok']:>6} {s['rejected']:>5} {s['errors']:>5} {s['rps']:>7.2f} "
+              f"{fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])} {fmt(s['max_ms'])}")
+    lag = report["event_loop_lag_ms"]
+    print(f"\n🌀 Event loop lag: p50 {fmt(lag['p50'])} ms, p99 {fmt(lag['p99'])} ms, max {fmt(lag['max'])} ms")
+    if "job_queue" in report:
+        queue = report["job_queue"]
+        print(f"📦 Job queue: batch sizes {queue['batch_sizes']}, p95 {queue['latency_p95']}, "
+              f"throughput {queue['throughput']:.2f} jobs/s")
+
+
+async def main_async(args):
+    import httpx
+
+    weights = parse_mix(args.mix)
+    photos, mask = build_payloads(args)
+    timeout = httpx.Timeout(args.drain_timeout + args.duration)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=timeout)
+    else:
+        from .endpoints import _seed_catalog, _fill_gallery
+        from .stubs import install_stubs
+
+        # Pas d'évènement startup (ASGITransport) : aucun warm-up, les backends factices répondent
+        install_stubs(args.generate_ms, args.inpaint_ms, args.detect_ms, args.jitter, args.batch_cost)
+        from main import app
+        _seed_catalog(args.catalog_size)
+        os.makedirs("static/gallery", exist_ok=True)
+        _fill_gallery("static/gallery", args.gallery_size)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lumina", timeout=timeout)
+
+    async with client:
+        records, lag_samples, injected, elapsed, timed_out = await run_load(args, client, weights, photos, mask)
+
+    report = summarize(records, lag_samples, injected, elapsed, timed_out)
+    report["config"] = vars(args)
+    if not args.url:
+        from app.services.job_queue import job_queue
+        report["job_queue"] = job_queue.stats()
+    return report
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    output = os.path.abspath(args.output) if args.output else None
+
+    if not args.url:
+        # Application en processus : base SQLite, uploads, galerie et caches temporaires
+        workdir = tempfile.mkdtemp(prefix="lumina-load-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+        os.environ.setdefault("WARMUP_MODELS", "")
+        os.chdir(workdir)
+        print(f"🧪 In-process app in {workdir}")
+    sys.path.insert(0, BACKEND_DIR)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+from .harness import measure
+
+# Tailles d'images synthétiques (largeur, hauteur) : photo mobile -> annonce haute résolution
+IMAGE_SIZES = [(512, 384), (1024, 768), (2048, 1536), (4096, 3072)]
+QUICK_IMAGE_SIZES = IMAGE_SIZES[:2]
+
+
+def synthetic_room(width, height, seed=0):
+    """Image BGR déterministe avec aplats, meubles (rectangles) et bruit : Canny y trouve des contours."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    # Mur / sol
+    image[: height * 2 // 3] = (200, 210, 220)
+    image[height * 2 // 3:] = (90, 120, 150)
+    for _ in range(12):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(width // 20, width // 4)), int(rng.integers(height // 20, height // 4))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x, y), (x + w, y + h), color, thickness=-1)
+    noise = rng.integers(-8, 8, image.shape, dtype=np.int16)
+    return np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def run(results, workdir, quick=False, repeat=20):
+    import cv2
+    from PIL import Image
+    from app.services.image_utils import (
+        process_canny, resize_image, get_dominant_color, image_to_base64, base64_to_image, canny_cache
+    )
+
+    print("🖼️ Preprocessing")
+    for width, height in QUICK_IMAGE_SIZES if quick else IMAGE_SIZES:
+        label = f"{width}x{height}"
+        bgr = synthetic_room(width, height)
+        path = os.path.join(workdir, f"room_{label}.jpg")
+        cv2.imwrite(path, bgr)
+        pil = Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+        # Les grandes images sont plus lentes : moins de mesures
+        n = max(3, repeat // 4) if width >= 2048 else repeat
+
+        # Canny : calcul complet (cache vidé) puis servi par le cache
+        results.add(f"preprocessing.process_canny[{label}]", measure(
+            lambda: process_canny(path), repeat=n, setup=canny_cache.clear
+        ))
+        results.add(f"preprocessing.process_canny_cached[{label}]", measure(lambda: process_canny(path), repeat=n))
+        results.add(f"preprocessing.resize_image[{label}]", measure(lambda: resize_image(bgr, max_size=1024), repeat=n))
+        results.add(f"preprocessing.get_dominant_color[{label}]", measure(lambda: get_dominant_color(pil), repeat=n))
+
+        encoded = image_to_base64(pil)
+        results.add(f"preprocessing.image_to_base64[{label}]", measure(lambda: image_to_base64(pil), repeat=n))
+        # Image.open est paresseux : load() force le décodage
+        results.add(f"preprocessing.base64_to_image[{label}]", measure(
+            lambda: base64_to_image(encoded).load(), repeat=n
+        ))
@@ -0,0 +1,95 @@
+"""
+Micro-benchmarks des chemins critiques (CPU, hors ligne) :
+prétraitement d'image, catalogue (/products) et galerie (/gallery).
+
+Depuis backend/ :
+    python -m benchmarks.run                                  # tout, résultats JSON dans benchmarks/results.json
+    python -m benchmarks.run --quick --suite preprocessing
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.2   # code 1 si régression
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITES = ("preprocessing", "catalog", "gallery")
+DEFAULT_OUTPUT = os.path.join(BACKEND_DIR, "benchmarks", "results.json")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LuminaSpace micro-benchmarks")
+    parser.add_argument("--suite", default=",".join(SUITES), help=f"Suites à lancer ({', '.join(SUITES)})")
+    parser.add_argument("--quick", action="store_true", help="Petites tailles seulement (vérification rapide)")
+    parser.add_argument("--repeat", type=int, default=20, help="Mesures par cas")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Fichier JSON des résultats")
+    parser.add_argument("--baseline", help="Résultats de référence à comparer (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Ralentissement toléré (0.15 = +15%%)")
+    parser.add_argument("--save-baseline", help="Enregistre aussi les résultats comme référence")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    suites = [suite.strip() for suite in args.suite.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        sys.exit(f"Unknown suite(s): {', '.join(sorted(unknown))}")
+    paths = {name: os.path.abspath(path) for name, path in (
+        ("output", args.output), ("baseline", args.baseline), ("save_baseline", args.save_baseline)
+    ) if path}
+
+    # Environnement isolé : base SQLite, galerie et caches dans un dossier temporaire
+    workdir = tempfile.mkdtemp(prefix="lumina-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("CANNY_CACHE_DISK_MB", "0")
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+
+    from .harness import Results, compare
+    from . import preprocessing, endpoints
+
+    print(f"⏱️ Benchmarks in {workdir} ({'quick' if args.quick else 'full'}, {args.repeat} runs per case)")
+    results = Results()
+    if "preprocessing" in suites:
+        preprocessing.run(results, workdir, quick=args.quick, repeat=args.repeat)
+    if "catalog" in suites:
+        endpoints.run_catalog(results, quick=args.quick, repeat=args.repeat)
+    if "gallery" in suites:
+        endpoints.run_gallery(results, quick=args.quick, repeat=args.repeat)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "quick": args.quick,
+            "repeat": args.repeat,
+            "suites": suites,
+        },
+        "results": results.cases,
+    }
+    for key in ("output", "save_baseline"):
+        if key in paths:
+            os.makedirs(os.path.dirname(paths[key]), exist_ok=True)
+            with open(paths[key], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Results written to {paths[key]}")
+
+    if "baseline" in paths:
+        with open(paths["baseline"], encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results.cases, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) above +{args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n✅ No regression above +{args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Backends factices pour les tests de charge : remplacent les méthodes d'inférence des
+singletons (MLService, InpaintingService, VisionService) par une latence synthétique.
+Tout le reste (routes, file d'inférence, micro-batching, caches, sauvegarde) est réel.
+"""
+import random
+import time
+
+
+class StubLatency:
+    """
+    Latence synthétique d'un appel (ms) : `base_ms` pour une image, +`batch_cost`
+    x base_ms par image supplémentaire d'un batch, bruit relatif `jitter`.
+    """
+
+    def __init__(self, base_ms, jitter=0.2, batch_cost=0.6):
+        self.base_ms = base_ms
+        self.jitter = jitter
+        self.batch_cost = batch_cost
+
+    def seconds(self, batch_size=1):
+        base = self.base_ms * (1 + self.batch_cost * (batch_size - 1))
+        return max(0.0, random.gauss(base, base * self.jitter)) / 1000
+
+
+def _run_steps(latency_s, steps, callback):
+    # Un sleep par step : le worker est occupé comme avec un vrai pipeline,
+    # la progression et l'annulation passent par le même callback
+    for step in range(steps):
+        time.sleep(latency_s / steps)
+        if callback is not None:
+            callback(None, step, None, {})
+
+
+def install_stubs(generate_ms=800, inpaint_ms=1200, detect_ms=40, jitter=0.2, batch_cost=0.6):
+    """Installe les backends factices sur les singletons (à appeler avant le premier appel)."""
+    from PIL import Image
+    from app.services.image_utils import tile_boxes
+    from app.services.ml_service import ml_service, inpainting_service, GENERATION_TILE_SIZE, GENERATION_TILE_OVERLAP
+    from app.services.vision_service import vision_service, detection_cache
+
+    generate = StubLatency(generate_ms, jitter, batch_cost)
+    inpaint = StubLatency(inpaint_ms, jitter, batch_cost)
+    detect = StubLatency(detect_ms, jitter, batch_cost)
+
+    def generate_batch(prompts, images, negative_prompts, steps=20, guidance_scale=7.5, style_loras=(), seed=None,
+                       callback=None, latents=None):
+        _run_steps(generate.seconds(len(prompts)), steps, callback)
+        return [Image.new("RGB", image.size, (128, 128, 128)) for image in images]
+
+    def generate_tiled(prompt, image, negative_prompt="", steps=20, guidance_scale=7.5, style_loras=(),
+                       tile_size=GENERATION_TILE_SIZE, overlap=GENERATION_TILE_OVERLAP, callback=None):
+        # Une génération par tuile, comme le pipeline réel
+        size = (image.width // 8 * 8, image.height // 8 * 8)
+        for _ in tile_boxes(size, tile_size, overlap):
+            _run_steps(generate.seconds(), steps, callback)
+        return Image.new("RGB", size, (128, 128, 128))
+
+    def inpaint_image(prompt, image, mask_image, ip_adapter_image=None, negative_prompt="", steps=20,
+                      guidance_scale=7.5, ip_adapter_image_embeds=None, width=None, height=None, callback=None):
+        _run_steps(inpaint.seconds(), steps, callback)
+        return Image.new("RGB", (width or image.width, height or image.height), (128, 128, 128))
+
+    def detect_batch(images, conf_threshold=0.25, batch_size=16, digests=None):
+        digests = digests or [None] * len(images)
+        time.sleep(detect.seconds(len(images)))
+        results = []
+        for digest in digests:
+            objects = [{
+                "label": "couch",
+                "confidence": 0.9,
+                "position": {"x": 30.0, "y": 40.0},
+                "box": [0.3, 0.4, 0.25, 0.2],
+            }]
+            key = vision_service._cache_key(digest, conf_threshold)
+            if key:
+                detection_cache.put(key, objects)
+            results.append(objects)
+        return results
+
+    ml_service.generate_batch = generate_batch
+    ml_service.generate_tiled = generate_tiled
+    inpainting_service.inpaint = inpaint_image
+    vision_service.detect_batch = detect_batch
+    print(f"🧪 Stub backends: generate {generate_ms}ms, inpaint {inpaint_ms}ms, detect {detect_ms}ms (±{jitter:.0%})")
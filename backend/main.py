@@ -1,15 +1,26 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
-# Import Routers
-from app.routers import generation, detection, gallery, products, auth
-from app.database import engine
+# Import Routers (torch / diffusers / ultralytics ne sont importés qu'au chargement des modèles)
+from app.routers import generation, detection, gallery, products, auth, jobs, system, health
+from app.database import engine, ensure_schema
 from app import models
+from app.services.image_fetcher import image_fetcher
+from app.services.warmup import warmup_state, start_warmup
+from app.services.metrics import metrics
+from app.services.profiler import PROFILE_HEADER, current_profile, start_request_profile
+from app.routers.auth import verify_admin
+
+warmup_state.import_seconds = time.perf_counter() - _import_started
+print(f"⚡ App modules imported in {warmup_state.import_seconds:.2f}s")
 
-# Create Database Tables
-models.Base.metadata.create_all(bind=engine)
+# Create Database Tables (+ colonnes ajoutées depuis)
+ensure_schema(engine)
 
 app = FastAPI(title="Lumina Spaces API")
 
@@ -20,8 +31,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Catalog-Version", "X-Profile-Id"],
 )
 
+# --- Métriques HTTP ---
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Gabarit de route (/jobs/{job_id}) plutôt que le chemin : cardinalité bornée
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.count_request(request.method, route_path, status, time.perf_counter() - started)
+
+# --- Profilage à la demande ---
+async def _admin_profile_requested(request):
+    if request.headers.get(PROFILE_HEADER) != "1":
+        return False
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    try:
+        return await verify_admin(token)
+    except HTTPException:
+        return False
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    profile = start_request_profile(request.method, request.url.path, await _admin_profile_requested(request))
+    if profile is None:
+        return await call_next(request)
+
+    # Le contextvar suit la requête jusqu'aux jobs qu'elle soumet (profilés dans le worker)
+    token = current_profile.set(profile)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_profile.reset(token)
+        profile.request_seconds = time.perf_counter() - started
+    profile.status_code = response.status_code
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
 # --- Static Files ---
 # Servir les fichiers statiques (images sauvegardées)
 # Assurez-vous que le dossier static existe à la racine du backend
@@ -34,6 +91,21 @@ app.include_router(detection.router)
 app.include_router(gallery.router)
 app.include_router(products.router)
 app.include_router(auth.router)
+app.include_router(jobs.router)
+app.include_router(system.router)
+app.include_router(health.router)
+
+# --- Lifecycle ---
+@app.on_event("startup")
+async def startup():
+    # Pool de connexions HTTP partagé (images produits distantes)
+    image_fetcher.start()
+    # Chargement des modèles + inférence factice en arrière-plan (voir /health/ready)
+    start_warmup()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await image_fetcher.close()
 
 @app.get("/")
 def read_root():
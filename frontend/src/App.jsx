@@ -17,6 +17,8 @@ import { api } from './services/api';
 
 export default function App() {
   const [isGenerating, setIsGenerating] = useState(false);
+  const [generationProgress, setGenerationProgress] = useState(null); // { step, total_steps, preview }
+  const [currentJobId, setCurrentJobId] = useState(null);
   const [selectedStyle, setSelectedStyle] = useState('indus');
   const [prompt, setPrompt] = useState('');
   const [selectedFile, setSelectedFile] = useState(null);
@@ -86,8 +88,12 @@ export default function App() {
     formData.append('style', selectedStyle);
 
     try {
-      // 1. Génération de l'image
-      const genData = await api.generateImage(formData);
+      // 1. Génération de l'image (job + aperçus progressifs)
+      const job = await api.submitGenerateJob(formData);
+      setCurrentJobId(job.job_id);
+      const genData = await api.streamJob(job.job_id, (progress) => {
+        setGenerationProgress((previous) => ({ ...previous, ...progress }));
+      });
 
       if (genData && genData.generated_image) {
         setGeneratedImage(genData.generated_image);
@@ -104,9 +110,15 @@ export default function App() {
       alert("Erreur lors du traitement.");
     } finally {
       setIsGenerating(false);
+      setGenerationProgress(null);
+      setCurrentJobId(null);
     }
   };
 
+  const handleCancelGeneration = async () => {
+    if (currentJobId) await api.cancelJob(currentJobId);
+  };
+
 
   const handleMaskGenerated = async (maskBlob) => {
     setIsMasking(false);
@@ -124,6 +136,8 @@ export default function App() {
 
         formData.append('image', imageToSend); 
         formData.append('mask', maskBlob, 'mask.png');
+        // Inpainting limité à la zone du masque, résolution d'origine conservée
+        formData.append('crop', 'true');
         
         // LOGIQUE SÉPARÉE SELON LE MODE
         if (inpaintMode === 'remove') {
@@ -136,6 +150,7 @@ export default function App() {
             formData.append('prompt', prompt || "high quality interior");
             
             if (selectedProductToStage) {
+                formData.append('product_id', selectedProductToStage.id);
                 formData.append('product_image_url', selectedProductToStage.image);
                 formData.set('prompt', selectedProductToStage.name + ", " + selectedProductToStage.category);
                 console.log("Mode Ajout : Produit envoyé", selectedProductToStage.name);
@@ -281,6 +296,8 @@ export default function App() {
                 beforeImage={previewUrl}
                 afterImage={generatedImage}
                 isGenerating={isGenerating}
+                progress={generationProgress}
+                onCancel={currentJobId ? handleCancelGeneration : null}
                 detectedObjects={detectedObjects}
                 onObjectClick={handleObjectClick}
             />
@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { MoveHorizontal } from 'lucide-react';
 
-const CompareSlider = ({ beforeImage, afterImage, isGenerating, detectedObjects, onObjectClick }) => {
+const CompareSlider = ({ beforeImage, afterImage, isGenerating, progress, onCancel, detectedObjects, onObjectClick }) => {
   const [sliderPosition, setSliderPosition] = useState(50);
   const [isDragging, setIsDragging] = useState(false);
 
@@ -61,8 +61,25 @@ const CompareSlider = ({ beforeImage, afterImage, isGenerating, detectedObjects,
       {/* Loader Overlay */}
       {isGenerating && (
         <div className="absolute inset-0 flex flex-col items-center justify-center z-50 bg-black/40 backdrop-blur-sm">
-          <div className="w-16 h-16 border-4 border-amber-500 border-t-transparent rounded-full animate-spin mb-4"></div>
-          <p className="text-amber-400 font-mono tracking-widest animate-pulse">RENDERING TEXTURES...</p>
+          {/* Aperçu progressif (latents basse résolution) */}
+          {progress && progress.preview && (
+            <img src={progress.preview} alt="" className="absolute inset-0 w-full h-full object-cover opacity-80" />
+          )}
+          <div className="relative flex flex-col items-center">
+            <div className="w-16 h-16 border-4 border-amber-500 border-t-transparent rounded-full animate-spin mb-4"></div>
+            <p className="text-amber-400 font-mono tracking-widest animate-pulse">
+              {progress ? `RENDERING ${progress.step}/${progress.total_steps}` : 'RENDERING TEXTURES...'}
+            </p>
+            {onCancel && (
+              <button
+                onClick={(e) => { e.stopPropagation(); onCancel(); }}
+                onMouseDown={(e) => e.stopPropagation()}
+                className="mt-4 px-4 py-2 rounded-lg border border-white/20 bg-black/60 text-white text-xs font-bold hover:bg-red-500 transition"
+              >
+                Annuler
+              </button>
+            )}
+          </div>
         </div>
       )}
 
@@ -5,6 +5,7 @@ import { api } from '../services/api';
 const GalleryModal = ({ isOpen, onClose, onLoadImage }) => {
   const [images, setImages] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
 
   useEffect(() => {
     if (isOpen) {
@@ -12,12 +13,13 @@ const GalleryModal = ({ isOpen, onClose, onLoadImage }) => {
     }
   }, [isOpen]);
 
-  const fetchGallery = async () => {
+  const fetchGallery = async (cursor = null) => {
     setLoading(true);
     try {
-      const data = await api.fetchGallery();
+      const data = await api.fetchGallery(cursor);
       if (data && data.images) {
-        setImages(data.images);
+        setImages(prev => cursor ? [...prev, ...data.images] : data.images);
+        setNextCursor(data.next_cursor ?? null);
       }
     } catch (err) {
       console.error("Erreur chargement galerie", err);
@@ -40,14 +42,21 @@ const GalleryModal = ({ isOpen, onClose, onLoadImage }) => {
         </div>
         
         <div className="p-6 overflow-y-auto grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4">
-          {loading ? (
+          {loading && images.length === 0 ? (
             <div className="col-span-full text-center py-10 text-gray-400">Chargement...</div>
           ) : images.length === 0 ? (
             <div className="col-span-full text-center py-10 text-gray-400">Aucune création pour le moment.</div>
           ) : (
             images.map((img) => (
               <div key={img.id} className="group relative aspect-square rounded-xl overflow-hidden border border-white/5 hover:border-amber-500/50 transition cursor-pointer">
-                <img src={img.url} alt="Creation" className="w-full h-full object-cover" />
+                <img
+                  src={img.thumbnails?.['256'] || img.url}
+                  srcSet={img.thumbnails?.['512'] ? `${img.thumbnails['256']} 256w, ${img.thumbnails['512']} 512w` : undefined}
+                  sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw"
+                  loading="lazy"
+                  alt="Creation"
+                  className="w-full h-full object-cover"
+                />
                 <div className="absolute inset-0 bg-black/60 opacity-0 group-hover:opacity-100 transition flex items-center justify-center gap-2">
                   <button 
                     onClick={() => { onLoadImage(img.url); onClose(); }}
@@ -69,6 +78,15 @@ const GalleryModal = ({ isOpen, onClose, onLoadImage }) => {
               </div>
             ))
           )}
+          {nextCursor && (
+            <button
+              onClick={() => fetchGallery(nextCursor)}
+              disabled={loading}
+              className="col-span-full py-3 text-sm text-gray-400 hover:text-white border border-white/10 rounded-xl transition"
+            >
+              {loading ? 'Chargement...' : 'Voir plus'}
+            </button>
+          )}
         </div>
       </div>
     </div>
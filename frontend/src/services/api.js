@@ -10,6 +10,36 @@ export const api = {
     return response.data;
   },
 
+  // Génération en job : progression et aperçus en direct (SSE), annulable
+  submitGenerateJob: async (formData) => {
+    const response = await axios.post(`${API_URL}/jobs/generate`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  },
+
+  streamJob: (jobId, onProgress) => new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_URL}/jobs/${jobId}/events`);
+    source.addEventListener('progress', (e) => onProgress && onProgress(JSON.parse(e.data)));
+    source.addEventListener('done', (e) => {
+      source.close();
+      resolve(JSON.parse(e.data).result);
+    });
+    source.addEventListener('error', (e) => {
+      source.close();
+      reject(new Error(e.data ? JSON.parse(e.data).error : 'Connexion au flux perdue'));
+    });
+    source.addEventListener('cancelled', () => {
+      source.close();
+      resolve(null);
+    });
+  }),
+
+  cancelJob: async (jobId) => {
+    const response = await axios.post(`${API_URL}/jobs/${jobId}/cancel`);
+    return response.data;
+  },
+
   detectObjects: async (formData) => {
     const response = await axios.post(`${API_URL}/detect`, formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
@@ -17,8 +47,9 @@ export const api = {
     return response.data;
   },
 
-  fetchGallery: async () => {
-    const response = await axios.get(`${API_URL}/gallery`);
+  fetchGallery: async (cursor = null) => {
+    const params = cursor ? { cursor } : {};
+    const response = await axios.get(`${API_URL}/gallery`, { params });
     return response.data;
   },
 